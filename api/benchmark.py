@@ -0,0 +1,304 @@
+"""
+	query-count and wall-time budget helpers shared by the apps tests.
+
+	seed_dataset() fill the test database with a synthetic but realistic dataset
+	and BudgetTestCase measure every request, fail when an endpoint use more
+	queries or time than its budget and collect the measurements in a json
+	report. environment variables:
+		BENCHMARK_SCALE -> float : multiply the dataset size (default 1)
+		BENCHMARK_TIME_FACTOR -> float : multiply every wall-time budget (default 1)
+		BENCHMARK_REPORT -> String : path of the json report, not written if not set
+
+"""
+import json
+import os
+import random
+import re
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from blog.models import Post, Tag, Comment
+from blog.visits import flush_visits
+from contactus.models import Contact
+from customauth.models import Profile
+from search.backends import get_backend
+from .models import Group, Movie
+from .views_utils import refresh_movie_counts
+
+SCALE = float(os.environ.get("BENCHMARK_SCALE", 1))
+TIME_FACTOR = float(os.environ.get("BENCHMARK_TIME_FACTOR", 1))
+REPORT_PATH = os.environ.get("BENCHMARK_REPORT")
+PASSWORD = "benchmark-Pa55word"
+
+# default wall-time budget of a request in seconds
+DEFAULT_TIME_BUDGET = 0.5
+
+# tables that grow with users, a full scan of them is a missing index
+HOT_TABLES = (
+	"auth_user", "customauth_profile", "customauth_profile_group", "api_group",
+	"api_movie", "blog_post", "blog_post_tags", "blog_comment", "blog_tag")
+
+REPORT = {"scale": SCALE, "dataset": {}, "endpoints": {}}
+
+
+def scaled(count):
+	return max(1, int(count * SCALE))
+
+
+def seed_dataset():
+	"""
+		bulk create users, profiles, groups, memberships, movies, tags, posts,
+		comments and contacts and build the search index. the random generator is seeded so query counts are
+		the same on every run. returns a dict of objects the tests request with:
+			member -> User : admin of 'group' and author of 'own_posts'
+			outsider -> User : member of no group
+			author -> User : member of 'group' and many other groups
+			group -> Group : big group that 'member' and 'author' are members of
+			group_post -> Post : 'group' visibility post of 'author' with tags and comments
+
+	"""
+
+	rng = random.Random(0)
+	password = make_password(PASSWORD)
+
+	User.objects.create(
+		username="admin", email="admin@example.com", first_name="admin",
+		password=password, is_staff=True, is_superuser=True)
+	User.objects.bulk_create([
+		User(
+			username="user{0}".format(index), email="user{0}@example.com".format(index),
+			first_name="user{0}".format(index), password=password)
+		for index in range(scaled(2000))])
+	users = list(User.objects.order_by("pk"))
+	Profile.objects.bulk_create([Profile(user=user) for user in users])
+	profiles = list(Profile.objects.order_by("pk"))
+
+	Group.objects.bulk_create([
+		Group(name="group{0}".format(index), admin=rng.choice(users))
+		for index in range(scaled(100))])
+	groups = list(Group.objects.order_by("pk"))
+
+	member, author, outsider = users[1], users[2], users[3]
+	group = groups[0]
+	Group.objects.filter(pk=group.pk).update(admin=member)
+	group.admin = member
+
+	memberships = set()
+	for profile in profiles[4:]:
+		for joined in rng.sample(groups, rng.randint(0, 3)):
+			memberships.add((profile.pk, joined.pk))
+	# 'group' has 50 members and 'author' is in many groups
+	for profile in profiles[4:50]:
+		memberships.add((profile.pk, group.pk))
+	memberships.add((profiles[1].pk, group.pk))
+	for joined in groups[:10]:
+		memberships.add((profiles[2].pk, joined.pk))
+	Through = Profile.group.through
+	Through.objects.bulk_create([
+		Through(profile_id=profile_id, group_id=group_id)
+		for profile_id, group_id in sorted(memberships)])
+
+	Movie.objects.bulk_create([
+		Movie(
+			name="movie {0}".format(index), user=user,
+			description="description of movie {0}".format(index),
+			review="review of movie {0}".format(index) * 20,
+			year=rng.randint(1950, 2020), imdb_rate=round(rng.uniform(1, 10), 1),
+			watched=rng.random() < 0.3)
+		for user in users[1:] for index in range(5)])
+	refresh_movie_counts()
+
+	Tag.objects.bulk_create([
+		Tag(name="tag{0}".format(index), slug="tag{0}".format(index))
+		for index in range(scaled(200))])
+	tags = list(Tag.objects.order_by("pk"))
+
+	visibilities = ["draft", "group", "all"]
+	posts = [
+		Post(
+			title="post {0}".format(index), body="body of post {0}. ".format(index) * 50,
+			author=rng.choice(users[1:]), visibility=rng.choice(visibilities))
+		for index in range(scaled(3000))]
+	posts += [
+		Post(
+			title="own post {0}".format(index), body="body", author=member,
+			visibility=visibilities[index % 3])
+		for index in range(20)]
+	posts.append(Post(
+		title="group post", body="body of group post", author=author,
+		visibility="group"))
+	Post.objects.bulk_create(posts)
+	posts = list(Post.objects.order_by("pk"))
+
+	PostTags = Post.tags.through
+	post_tags = []
+	for post in posts:
+		for tag in rng.sample(tags, rng.randint(0, 4)):
+			post_tags.append(PostTags(post_id=post.pk, tag_id=tag.pk))
+	Comment.objects.bulk_create([
+		Comment(
+			post=rng.choice(posts), author=rng.choice(users[1:]),
+			body="comment {0}".format(index), is_active=rng.random() < 0.9)
+		for index in range(scaled(10000))])
+
+	group_post = posts[-1]
+	post_tags += [PostTags(post_id=group_post.pk, tag_id=tag.pk) for tag in tags[:5]]
+	PostTags.objects.bulk_create(post_tags)
+	Tag.objects.refresh_post_counts()
+	Comment.objects.bulk_create([
+		Comment(post=group_post, author=user, body="comment on group post")
+		for user in users[10:30]])
+
+	# Contact.key is only 10 shuffled digits, explicit keys avoid collisions
+	Contact.objects.bulk_create([
+		Contact(
+			key="{0:013d}".format(index), name="contact{0}".format(index), email="contact{0}@example.com".format(index),
+			text="text of contact {0}".format(index))
+		for index in range(scaled(500))])
+
+	get_backend().rebuild()
+
+	REPORT["dataset"] = {
+		"users": User.objects.count(),
+		"groups": Group.objects.count(),
+		"memberships": Through.objects.count(),
+		"movies": Movie.objects.count(),
+		"tags": Tag.objects.count(),
+		"posts": Post.objects.count(),
+		"comments": Comment.objects.count(),
+		"contacts": Contact.objects.count(),
+	}
+	return {
+		"member": User.objects.get(pk=member.pk),
+		"author": User.objects.get(pk=author.pk),
+		"outsider": User.objects.get(pk=outsider.pk),
+		"group": Group.objects.get(pk=group.pk),
+		"group_post": group_post,
+	}
+
+
+def full_scans(sql):
+	"""
+		'SCAN' steps of the sqlite query plan of 'sql' that read a whole HOT_TABLES
+		table, aliases of django subqueries (U0, U1, ...) are resolved from the sql.
+
+	"""
+
+	aliases = {
+		alias: table for table, alias in re.findall(r'"(\w+)" (U\d+)', sql)}
+	with connection.cursor() as cursor:
+		cursor.execute("EXPLAIN QUERY PLAN " + sql)
+		details = [row[-1] for row in cursor.fetchall()]
+	scans = []
+	for detail in details:
+		words = detail.split()
+		if len(words) < 2 or words[0] != "SCAN":
+			continue
+		table = aliases.get(words[1], words[1])
+		# 'USING INDEX' walks an index in order, the covering or searched rows only
+		if table in HOT_TABLES and "INDEX" not in detail:
+			scans.append(detail)
+	return scans
+
+
+def write_report():
+	if REPORT_PATH is None:
+		return
+	with open(REPORT_PATH, "w") as report_file:
+		json.dump(REPORT, report_file, indent=2, sort_keys=True)
+
+
+# visits are flushed by the tests, not by a thread on its own connection
+@override_settings(POST_VISITS_FLUSH_THREAD=False)
+class BudgetTestCase(APITestCase):
+	"""
+		base test case of endpoint budgets. seed the dataset once per class and
+		give 'assertWithinBudget' to measure a request.
+
+	"""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.data = seed_dataset()
+
+	@classmethod
+	def tearDownClass(cls):
+		super(BudgetTestCase, cls).tearDownClass()
+		write_report()
+
+	def setUp(self):
+		# every test starts cold so the counts dont depend on tests order
+		cache.clear()
+		flush_visits()
+
+	def tearDown(self):
+		# written in the test transaction, not at exit in the real database
+		flush_visits()
+
+	def authenticate(self, user):
+		""" send a real access token so authentication queries are counted too. """
+		self.client.credentials(
+			HTTP_AUTHORIZATION="Bearer {0}".format(AccessToken.for_user(user)))
+
+	def assertWithinBudget(
+			self, name, method, url, queries, status, seconds=DEFAULT_TIME_BUDGET,
+			**kwargs):
+		"""
+			send the request and fail if response status is not 'status' or it used
+			more than 'queries' database queries or 'seconds' wall-time.
+			'name' is the endpoint identifier in the report.
+			returns the response.
+
+		"""
+
+		with CaptureQueriesContext(connection) as context:
+			started = time.perf_counter()
+			response = getattr(self.client, method)(url, **kwargs)
+			elapsed = time.perf_counter() - started
+
+		seconds = seconds * TIME_FACTOR
+		REPORT["endpoints"][name] = {
+			"method": method.upper(),
+			"status": response.status_code,
+			"queries": len(context.captured_queries),
+			"query_budget": queries,
+			"seconds": round(elapsed, 4),
+			"time_budget": seconds,
+		}
+		self.assertEqual(response.status_code, status, msg="{0}: {1}".format(name, getattr(response, "data", None)))
+		self.assertLessEqual(
+			len(context.captured_queries), queries,
+			msg="{0} used {1} queries, budget is {2}:\n{3}".format(
+				name, len(context.captured_queries), queries,
+				"\n".join(query["sql"] for query in context.captured_queries)))
+		self.assertLessEqual(
+			elapsed, seconds,
+			msg="{0} took {1:.3f}s, budget is {2}s".format(name, elapsed, seconds))
+		return response
+
+	def assertIndexed(self, name, method, url, status, **kwargs):
+		"""
+			send the request and fail if response status is not 'status' or the plan
+			of any of its SELECT queries does a full scan of a HOT_TABLES table.
+			returns the response.
+
+		"""
+
+		with CaptureQueriesContext(connection) as context:
+			response = getattr(self.client, method)(url, **kwargs)
+		self.assertEqual(response.status_code, status, msg="{0}: {1}".format(name, getattr(response, "data", None)))
+		for query in context.captured_queries:
+			if not query["sql"].startswith("SELECT"):
+				continue
+			scans = full_scans(query["sql"])
+			self.assertEqual(
+				scans, [], msg="{0} query does a full scan:\n{1}".format(name, query["sql"]))
+		return response
@@ -0,0 +1,70 @@
+from django.core.cache import cache
+import time
+
+
+def cache_version(version_key):
+	# a missing version (never set or evicted) starts from the current time so
+	# it can not collide with an entry cached under an older version
+	version = cache.get(version_key)
+	if version is None:
+		cache.add(version_key, time.time_ns(), timeout=None)
+		version = cache.get(version_key)
+	return version
+
+
+def bump_versions(*version_keys):
+	# bumping a version orphans the entries cached under it, they expire on their own
+	for version_key in version_keys:
+		try:
+			cache.incr(version_key)
+		except ValueError:
+			pass
+
+
+def group_movies_version_key(group_key):
+	return "group_movies_version:{0}".format(group_key)
+
+
+def group_movies_version(group_key):
+	return cache_version(group_movies_version_key(group_key))
+
+
+def group_movies_cache_key(group_key):
+	return "group_movies:{0}:{1}".format(group_key, group_movies_version(group_key))
+
+
+def invalidate_group_movies(*group_keys):
+	bump_versions(*[group_movies_version_key(group_key) for group_key in group_keys])
+
+
+def group_dashboard_version_key(group_key):
+	return "group_dashboard_version:{0}".format(group_key)
+
+
+def group_dashboard_versions(group_keys):
+	""" current dashboard version of every group in one cache round trip, missing ones are started. """
+	version_keys = {
+		group_key: group_dashboard_version_key(group_key) for group_key in group_keys}
+	found = cache.get_many(list(version_keys.values()))
+	return {
+		group_key: found[version_key] if version_key in found else cache_version(version_key)
+		for group_key, version_key in version_keys.items()}
+
+
+def invalidate_group_dashboard(*group_keys):
+	""" a group shown in the dashboard changed, every member cached entry that contains it is stale. """
+	bump_versions(*[group_dashboard_version_key(group_key) for group_key in group_keys])
+
+
+def user_dashboard_version_key(user_id):
+	return "user_dashboard_version:{0}".format(user_id)
+
+
+def user_dashboard_cache_key(user_id):
+	return "user_dashboard:{0}:{1}".format(
+		user_id, cache_version(user_dashboard_version_key(user_id)))
+
+
+def invalidate_user_dashboard(*user_ids):
+	""" the set of groups of the users changed, like joining a group. """
+	bump_versions(*[user_dashboard_version_key(user_id) for user_id in user_ids])
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.views_utils import refresh_movie_counts
+
+
+class Command(BaseCommand):
+	help = "recompute Profile.movie_count of every user from the movies table."
+
+	def handle(self, *args, **options):
+		updated = refresh_movie_counts()
+		self.stdout.write("movie_count of {0} profiles refreshed.".format(updated))
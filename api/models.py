@@ -27,12 +27,23 @@ class Movie(models.Model):
 	poster_link = models.URLField(null=True, blank=True)
 	date_and_time = models.DateTimeField(auto_now=True)
 
+	class Meta:
+		constraints = [
+			# its unique index also serve ordering user movies by name
+			models.UniqueConstraint(fields=["user", "name"], name="unique_movie_name_per_user"),
+		]
+		indexes = [
+			# user movies listing ordering and 'watched' filter
+			models.Index(fields=["user", "-date_and_time"], name="movie_user_modified_idx"),
+			models.Index(fields=["user", "watched"], name="movie_user_watched_idx"),
+		]
+
 	def __str__(self):
 		return self.name
 
 
 class Group(models.Model):
-	key = models.CharField(max_length=15, default=random_key)
+	key = models.CharField(max_length=15, default=random_key, unique=True)
 	name = models.CharField(max_length=50, unique=True)
 	meeting_detail = models.TextField(null=True, blank=True)
 	image = models.ImageField(
@@ -43,7 +54,7 @@ class Group(models.Model):
 		Movie, on_delete=models.CASCADE, null=True, blank=True)
 
 	admin = models.ForeignKey(User, on_delete=models.DO_NOTHING)
-	invite_code = models.CharField(max_length=28, default=invite_code)
+	invite_code = models.CharField(max_length=28, default=invite_code, unique=True)
 	date_and_time = models.DateTimeField(auto_now=True)
 
 	def __str__(self):
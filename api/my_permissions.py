@@ -0,0 +1,20 @@
+from rest_framework import permissions
+from .views_utils import share_group
+
+
+class IsGroupMemberOfAuthor(permissions.BasePermission):
+	"""
+		object permission for group restricted content. objects with
+		visibility="group" are available for the author and users that share at
+		least one group with the object author. other objects are not restricted.
+
+	"""
+
+	message = "this post is restricted to group and you are not part of the group."
+
+	def has_object_permission(self, request, view, obj):
+		if getattr(obj, "visibility", None) != "group":
+			return True
+		if obj.author_id == request.user.pk:
+			return True
+		return share_group(request.user, obj.author_id)
@@ -53,10 +53,17 @@ class MovieProfileSerializer(serializers.ModelSerializer):
 class MemberSerializer(serializers.ModelSerializer):
 	"""
 		used to show each user username and movies of it.
+		'fields' can limit the output to some of Meta.fields.
 		model = User
 	"""
 	movies = MovieProfileSerializer(many=True, source='movie')
 
+	def __init__(self, *args, fields=None, **kwargs):
+		super(MemberSerializer, self).__init__(*args, **kwargs)
+		if fields is not None:
+			for name in set(self.fields) - set(fields):
+				self.fields.pop(name)
+
 	class Meta:
 		model = User
 		fields = ("username", "movies")
@@ -77,13 +84,47 @@ class GroupSerializer(serializers.ModelSerializer):
 			"key", "name", "movie_of_the_week", "admin", "image", "meeting_detail")
 
 
+class GroupDashboardSerializer(serializers.ModelSerializer):
+	"""
+		like GroupSerializer but with the whole movie of the week inlined, so the
+		user groups dashboard needs no request per group.
+		admin and movie_of_the_week__user should be loaded with select_related.
+		model = Group
+	"""
+
+	admin = AdminSerializer(read_only=True, many=False)
+	movie_of_the_week = MovieSerializer(read_only=True, many=False)
+
+	class Meta:
+		model = Group
+		fields = (
+			"key", "name", "movie_of_the_week", "admin", "image", "meeting_detail")
+
+
+# names the 'fields' of GroupMemberSerializer can have
+GROUP_MEMBER_FIELDS = ("key", "image", "username", "movies")
+
+
 class GroupMemberSerializer(serializers.ModelSerializer):
 	"""
 		used to show group members key, movies, image, username.
+		'fields' can limit the output to some of GROUP_MEMBER_FIELDS so "movies"
+		can be omitted when only avatars are needed.
 	"""
 
 	user = MemberSerializer(read_only=True)
 
+	def __init__(self, *args, fields=None, **kwargs):
+		super(GroupMemberSerializer, self).__init__(*args, **kwargs)
+		if fields is not None:
+			for name in ("key", "image"):
+				if name not in fields:
+					self.fields.pop(name)
+			user_fields = [name for name in MemberSerializer.Meta.fields if name in fields]
+			self.fields.pop("user")
+			if user_fields:
+				self.fields["user"] = MemberSerializer(read_only=True, fields=user_fields)
+
 	class Meta:
 		model = Profile
 		fields = ("key", "image", "user")
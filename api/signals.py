@@ -0,0 +1,92 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.db.models import Q
+from django.dispatch import receiver, Signal
+from customauth.models import Profile
+from .models import Group, Movie
+from .views_utils import change_movie_count
+from .cache_utils import (
+	invalidate_group_movies, invalidate_group_dashboard, invalidate_user_dashboard)
+
+# sent with 'user' and 'keys' after movies of the user are created or updated
+# with bulk_create/bulk_update, which dont send post_save
+movies_bulk_changed = Signal()
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def movie_changed(sender, instance, **kwargs):
+	"""
+		any create, edit (including 'watched' flips) or delete of a movie changes the
+		pool of the owner groups, and the dashboard of the groups it is the movie of
+		the week of. both are found in the same query.
+
+	"""
+	groups = Group.objects.filter(
+		Q(profile__user_id=instance.user_id) | Q(movie_of_the_week_id=instance.pk)
+		).values_list("key", "movie_of_the_week_id").distinct()
+	invalidate_changed_movies_groups(groups, {instance.pk})
+
+
+@receiver(post_save, sender=Movie)
+def movie_created(sender, instance, created, **kwargs):
+	""" movies created around the views (admin, shell) take a slot too, without the MOVIE_PER_USER check. """
+	if created and not getattr(instance, "slot_reserved", False):
+		change_movie_count(instance.user_id, 1, limit=False)
+
+
+@receiver(post_delete, sender=Movie)
+def movie_deleted(sender, instance, **kwargs):
+	# every delete gives the slot back, from the views, the admin or a cascade
+	change_movie_count(instance.user_id, -1)
+
+
+@receiver(movies_bulk_changed)
+def movies_bulk_changed_handler(sender, user, keys, **kwargs):
+	groups = Group.objects.filter(
+		Q(profile__user=user) | Q(movie_of_the_week__key__in=keys)
+		).values_list("key", "movie_of_the_week__key").distinct()
+	invalidate_changed_movies_groups(groups, set(keys))
+
+
+def invalidate_changed_movies_groups(groups, movies):
+	# groups are (group key, movie of the week id or key) pairs, 'movies' the changed ones
+	groups = list(groups)
+	invalidate_group_movies(*{group_key for group_key, _ in groups})
+	invalidate_group_dashboard(*{
+		group_key for group_key, movie in groups if movie in movies})
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+	""" name, image, admin and movie of the week are all shown in the dashboard. """
+	invalidate_group_dashboard(instance.key)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+	invalidate_group_movies(instance.key)
+	invalidate_group_dashboard(instance.key)
+
+
+@receiver(m2m_changed, sender=Profile.group.through)
+def group_membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+	""" join, leave and member removal all go through Profile.group add/remove/clear. """
+	if action not in ("post_add", "post_remove", "pre_clear"):
+		return
+
+	if reverse:
+		# instance is the Group, removed members are covered by the group
+		# dashboard version, added ones need their own version bumped
+		group_keys = [instance.key]
+		if action == "post_add":
+			invalidate_user_dashboard(*Profile.objects.filter(
+				pk__in=pk_set).values_list("user_id", flat=True))
+	else:
+		if action == "pre_clear":
+			group_keys = instance.group.values_list("key", flat=True)
+		else:
+			group_keys = Group.objects.filter(pk__in=pk_set).values_list("key", flat=True)
+		invalidate_user_dashboard(instance.user_id)
+	group_keys = list(group_keys)
+	invalidate_group_movies(*group_keys)
+	invalidate_group_dashboard(*group_keys)
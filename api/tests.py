@@ -1,3 +1,311 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from api.benchmark import BudgetTestCase
+from api.models import Group, Movie
+from api.views_utils import cached_group_movie_keys
+from customauth.models import Profile
+
+
+class ApiEndpointBudgetTests(BudgetTestCase):
+	""" query-count and wall-time budgets of api/urls.py endpoints. """
+
+	def setUp(self):
+		super(ApiEndpointBudgetTests, self).setUp()
+		self.member = self.data["member"]
+		self.group = self.data["group"]
+		self.authenticate(self.member)
+
+	def test_create_group(self):
+		self.assertWithinBudget(
+			"api:group-add", "post", "/v1/api/group/add/", queries=6, status=201,
+			data={"name": "new group"})
+
+	def test_edit_group(self):
+		member_keys = list(
+			self.group.profile_set.exclude(user=self.member).values_list("key", flat=True)[:5])
+		response = self.assertWithinBudget(
+			"api:group-edit", "put", "/v1/api/group/{0}/".format(self.group.key),
+			queries=11, status=200, data={"name": "renamed group", "users": member_keys})
+		self.assertEqual(response.data["removed"], 5)
+		self.assertFalse(self.group.profile_set.filter(key__in=member_keys).exists())
+
+	def test_edit_group_unknown_member(self):
+		member_keys = list(
+			self.group.profile_set.exclude(user=self.member).values_list("key", flat=True)[:5])
+		response = self.assertWithinBudget(
+			"api:group-edit-unknown", "put", "/v1/api/group/{0}/".format(self.group.key),
+			queries=4, status=400,
+			data={"name": "renamed group", "users": member_keys + ["unknown"]})
+		self.assertEqual(response.data["users"], ["unknown"])
+		self.assertEqual(self.group.profile_set.filter(key__in=member_keys).count(), 5)
+		self.assertEqual(Group.objects.get(pk=self.group.pk).name, self.group.name)
+
+	def test_delete_group(self):
+		self.assertWithinBudget(
+			"api:group-delete", "delete", "/v1/api/group/{0}/".format(self.group.key),
+			queries=6, status=200)
+
+	def test_generate_invite_code(self):
+		self.assertWithinBudget(
+			"api:group-invite-code", "get",
+			"/v1/api/admin/group/invite_code/{0}/".format(self.group.key),
+			queries=5, status=200)
+
+	def test_join_group(self):
+		self.authenticate(self.data["outsider"])
+		self.assertWithinBudget(
+			"api:group-join", "get", "/v1/api/group/join/{0}/".format(self.group.invite_code),
+			queries=5, status=200)
+
+	def test_leave_group(self):
+		self.assertWithinBudget(
+			"api:group-leave", "get", "/v1/api/group/leave/{0}/".format(self.group.key),
+			queries=5, status=200)
+
+	def test_select_random_movie(self):
+		self.assertWithinBudget(
+			"api:group-movie-select", "get",
+			"/v1/api/group/movie/select/{0}/".format(self.group.key),
+			queries=4, status=200)
+
+	def group_pool(self):
+		# the cached pool the next pick is drawn from, filled by a pick first
+		self.client.get("/v1/api/group/movie/select/{0}/".format(self.group.key))
+		return set(cached_group_movie_keys(self.group.key))
+
+	def test_pool_after_submit(self):
+		movie_key = min(self.group_pool())
+		self.client.get("/v1/api/group/movie/submit/{0}/{1}/".format(self.group.key, movie_key))
+		self.assertNotIn(movie_key, self.group_pool())
+
+	def test_pool_after_watched_edit(self):
+		movie = self.member.movie.filter(watched=False).order_by("pk").first()
+		self.assertIn(movie.key, self.group_pool())
+		self.client.put("/v1/api/movie/{0}/".format(movie.key), data={"watched": True})
+		self.assertNotIn(movie.key, self.group_pool())
+		self.client.put("/v1/api/movie/{0}/".format(movie.key), data={"watched": False})
+		self.assertIn(movie.key, self.group_pool())
+
+	def test_pool_after_join_and_leave(self):
+		outsider = self.data["outsider"]
+		movie_keys = set(outsider.movie.filter(watched=False).values_list("key", flat=True))
+		self.assertTrue(movie_keys)
+		self.assertFalse(movie_keys & self.group_pool())
+		self.authenticate(outsider)
+		self.client.get("/v1/api/group/join/{0}/".format(self.group.invite_code))
+		self.assertLessEqual(movie_keys, self.group_pool())
+		self.client.get("/v1/api/group/leave/{0}/".format(self.group.key))
+		self.assertFalse(movie_keys & set(cached_group_movie_keys(self.group.key)))
+
+	def test_pool_after_member_removal(self):
+		removed = Movie.objects.filter(
+			user__profile__group=self.group, watched=False).exclude(
+			user=self.member).order_by("pk").first().user
+		movie_keys = set(removed.movie.filter(watched=False).values_list("key", flat=True))
+		self.assertLessEqual(movie_keys, self.group_pool())
+		self.client.put(
+			"/v1/api/group/{0}/".format(self.group.key), data={"users": [removed.profile.key]})
+		self.assertFalse(movie_keys & self.group_pool())
+
+	def test_pick_skips_removed_member_from_stale_pool(self):
+		removed = Movie.objects.filter(
+			user__profile__group=self.group, watched=False).exclude(
+			user=self.member).order_by("pk").first().user
+		movie_keys = set(removed.movie.filter(watched=False).values_list("key", flat=True))
+		self.group_pool()
+		# left in another process, the pool cached here is not invalidated
+		Profile.group.through.objects.filter(profile__user=removed, group=self.group).delete()
+		with mock.patch("api.views_utils.random.choice", return_value=min(movie_keys)):
+			response = self.client.get("/v1/api/group/movie/select/{0}/".format(self.group.key))
+		self.assertEqual(response.status_code, 200)
+		self.assertNotIn(response.data["key"], movie_keys)
+
+	def test_submit_movie(self):
+		movie = Movie.objects.filter(
+			user__profile__group=self.group, watched=False).order_by("pk").first()
+		self.assertWithinBudget(
+			"api:group-movie-submit", "get",
+			"/v1/api/group/movie/submit/{0}/{1}/".format(self.group.key, movie.key),
+			queries=7, status=200)
+
+	def test_all_group_members_profile(self):
+		self.assertWithinBudget(
+			"api:group-members", "get",
+			"/v1/api/group/all_profiles/{0}/".format(self.group.key),
+			queries=4, status=200)
+
+	def test_all_group_members_profile_fields(self):
+		url = "/v1/api/group/all_profiles/{0}/".format(self.group.key)
+		response = self.assertWithinBudget(
+			"api:group-members-fields", "get", url + "?fields=key,username",
+			queries=3, status=200)
+		for member in response.data["results"]:
+			self.assertEqual(set(member), {"key", "user"})
+			self.assertEqual(set(member["user"]), {"username"})
+		for fields in ("", "key,", "key,name"):
+			response = self.client.get(url + "?fields=" + fields)
+			self.assertEqual(response.status_code, 400)
+
+	def test_all_user_groups(self):
+		self.authenticate(self.data["author"])
+		self.assertWithinBudget(
+			"api:user-groups", "get", "/v1/api/user/groups/", queries=2, status=200)
+
+	def test_user_groups_dashboard(self):
+		author = self.data["author"]
+		movie = author.movie.order_by("pk").first()
+		self.group.movie_of_the_week = movie
+		self.group.save()
+		self.authenticate(author)
+		response = self.assertWithinBudget(
+			"api:user-groups-dashboard", "get", "/v1/api/user/groups/dashboard/",
+			queries=2, status=200)
+		groups = {group["key"]: group for group in response.data}
+		self.assertEqual(groups[self.group.key]["movie_of_the_week"]["key"], movie.key)
+		self.assertEqual(groups[self.group.key]["admin"]["username"], self.member.username)
+		self.assertWithinBudget(
+			"api:user-groups-dashboard-cached", "get", "/v1/api/user/groups/dashboard/",
+			queries=0, status=200)
+
+		# editing the movie of the week makes the cached dashboard stale
+		movie.name = "renamed movie"
+		movie.save()
+		response = self.client.get("/v1/api/user/groups/dashboard/")
+		groups = {group["key"]: group for group in response.data}
+		self.assertEqual(groups[self.group.key]["movie_of_the_week"]["name"], "renamed movie")
+
+	def test_user_groups_dashboard_after_join(self):
+		self.authenticate(self.data["outsider"])
+		self.assertEqual(self.client.get("/v1/api/user/groups/dashboard/").data, [])
+		self.data["outsider"].profile.group.add(self.group)
+		response = self.client.get("/v1/api/user/groups/dashboard/")
+		self.assertEqual([group["key"] for group in response.data], [self.group.key])
+
+	def test_create_movie(self):
+		self.assertWithinBudget(
+			"api:movie-create", "post", "/v1/api/movie/", queries=9, status=201,
+			data={"name": "new movie", "year": 2000, "imdb_rate": 7.5, "review": "good"})
+
+	def test_get_movies(self):
+		self.assertWithinBudget(
+			"api:movie-list", "get", "/v1/api/movie/", queries=2, status=200)
+
+	def test_get_movies_filtered(self):
+		self.assertWithinBudget(
+			"api:movie-list-filtered", "get",
+			"/v1/api/movie/?watched=false&year_min=1960&imdb_rate_min=2&ordering=name",
+			queries=2, status=200)
+
+	def test_batch_movies(self):
+		movies = list(self.member.movie.order_by("pk")[:3])
+		operations = [
+			{"action": "create", "data": {"name": "batch movie 1", "year": 2001}},
+			{"action": "create", "data": {"name": "batch movie 2", "imdb_rate": 8}},
+			{"action": "update", "key": movies[0].key, "data": {"watched": True}},
+			{"action": "update", "key": movies[1].key, "data": {"review": "edited"}},
+			{"action": "delete", "key": movies[2].key},
+		]
+		self.assertWithinBudget(
+			"api:movie-batch", "post", "/v1/api/movie/batch/", queries=19, status=200,
+			data=operations)
+		self.assertEqual(self.member.movie.count(), 6)
+
+	def test_batch_movies_rejected(self):
+		first, second = self.member.movie.order_by("pk")[:2]
+		for operations, index, field in (
+				([{"action": "update", "key": ["x"], "data": {"watched": True}}], 0, "key"),
+				# a swap passes the final names check but not the row by row constraint
+				([
+					{"action": "update", "key": first.key, "data": {"name": second.name}},
+					{"action": "update", "key": second.key, "data": {"name": first.name}},
+				], 0, "name")):
+			response = self.client.post("/v1/api/movie/batch/", data=operations)
+			self.assertEqual(response.status_code, 400)
+			self.assertIn(field, response.data["results"][index]["errors"])
+		self.assertEqual(self.member.movie.get(pk=first.pk).name, first.name)
+
+	def test_batch_movies_take_deleted_name(self):
+		first, second = self.member.movie.order_by("pk")[:2]
+		response = self.client.post("/v1/api/movie/batch/", data=[
+			{"action": "delete", "key": second.key},
+			{"action": "update", "key": first.key, "data": {"name": second.name}},
+		])
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(self.member.movie.get(pk=first.pk).name, second.name)
+
+	def test_edit_movie(self):
+		movie = self.member.movie.order_by("pk").first()
+		self.assertWithinBudget(
+			"api:movie-edit", "put", "/v1/api/movie/{0}/".format(movie.key),
+			queries=8, status=200, data={"watched": True, "review": "edited"})
+
+	def test_edit_movie_unchanged(self):
+		movie = self.member.movie.order_by("pk").first()
+		self.assertWithinBudget(
+			"api:movie-edit-unchanged", "put", "/v1/api/movie/{0}/".format(movie.key),
+			queries=3, status=200, data={"name": movie.name, "year": str(movie.year)})
+		self.assertEqual(Movie.objects.get(pk=movie.pk).date_and_time, movie.date_and_time)
+
+	def test_delete_movie(self):
+		movie = self.member.movie.order_by("pk").first()
+		self.assertWithinBudget(
+			"api:movie-delete", "delete", "/v1/api/movie/{0}/".format(movie.key),
+			queries=10, status=200)
+		self.assertFalse(Movie.objects.filter(pk=movie.pk).exists())
+		self.assertTrue(Group.objects.filter(pk=self.group.pk).exists())
+
+
+	def test_movie_count_outside_views(self):
+		# movies of the admin or shell are counted, deletes give the slot back
+		profile = self.member.profile
+		count = Profile.objects.get(pk=profile.pk).movie_count
+		movie = Movie.objects.create(name="shell movie", user=self.member)
+		self.assertEqual(Profile.objects.get(pk=profile.pk).movie_count, count + 1)
+		response = self.client.delete("/v1/api/movie/{0}/".format(movie.key))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(Profile.objects.get(pk=profile.pk).movie_count, count)
+
+		# a counter left at 0 by old rows is not decremented below it
+		Profile.objects.filter(pk=profile.pk).update(movie_count=0)
+		movie = self.member.movie.order_by("pk").first()
+		response = self.client.delete("/v1/api/movie/{0}/".format(movie.key))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(Profile.objects.get(pk=profile.pk).movie_count, 0)
+
+class ApiQueryPlanTests(BudgetTestCase):
+	""" key-based api routes should find their rows through indexes, not full scans. """
+
+	def setUp(self):
+		super(ApiQueryPlanTests, self).setUp()
+		self.member = self.data["member"]
+		self.group = self.data["group"]
+		self.authenticate(self.member)
+
+	def test_group_routes(self):
+		self.assertIndexed(
+			"api:group-edit", "put", "/v1/api/group/{0}/".format(self.group.key),
+			status=200, data={"meeting_detail": "unchanged"})
+		self.assertIndexed(
+			"api:select-random-movie", "get",
+			"/v1/api/group/movie/select/{0}/".format(self.group.key), status=200)
+		self.assertIndexed(
+			"api:all-group-members", "get",
+			"/v1/api/group/all_profiles/{0}/".format(self.group.key), status=200)
+		self.assertIndexed(
+			"api:user-groups-dashboard", "get", "/v1/api/user/groups/dashboard/",
+			status=200)
+
+	def test_join_group(self):
+		self.authenticate(self.data["outsider"])
+		self.assertIndexed(
+			"api:group-join", "get",
+			"/v1/api/group/join/{0}/".format(self.group.invite_code), status=200)
+
+	def test_movie_routes(self):
+		movie = self.member.movie.order_by("pk").first()
+		self.assertIndexed(
+			"api:movie-list-filtered", "get", "/v1/api/movie/?watched=false&ordering=name",
+			status=200)
+		self.assertIndexed(
+			"api:movie-edit", "put", "/v1/api/movie/{0}/".format(movie.key),
+			status=200, data={"watched": True})
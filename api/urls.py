@@ -2,7 +2,7 @@ from .views import (
 	CreateGroupView, EditAndDeleteGroupView, EditAndDeleteMovieView,
 	CreateAndGetMovieView, GetRandomMovieView, SubmitMovieView,
 	AllUserGroups, AllGroupMembersProfile, GenerateInviteCode, JoinGroup,
-	LeaveGroup
+	LeaveGroup, BatchMovieView, UserGroupsDashboard
 )
 from django.urls import path
 
@@ -17,6 +17,8 @@ urlpatterns = [
 	path("group/movie/submit/<str:group>/<str:movie>/", SubmitMovieView.as_view()),
 	path("group/all_profiles/<str:group_key>/", AllGroupMembersProfile.as_view()),
 	path("user/groups/", AllUserGroups.as_view()),
+	path("user/groups/dashboard/", UserGroupsDashboard.as_view()),
 	path("movie/", CreateAndGetMovieView.as_view()),
+	path("movie/batch/", BatchMovieView.as_view()),
 	path("movie/<str:key>/", EditAndDeleteMovieView.as_view()),
 ]
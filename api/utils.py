@@ -1,6 +1,7 @@
 import random
 import string
 from datetime import datetime
+from rest_framework import pagination
 
 
 def profile_image(instance, filename):
@@ -28,3 +29,39 @@ def invite_code():
 	random_key = ""
 	key = random_key.join(random.sample(allowed_chars, 15))
 	return "FILMMEETING" + key
+
+
+class MemberCursorPaginator(pagination.CursorPagination):
+	"""
+		cursor paginator for group members so big groups dont load at once.
+		next and previous pages are links in the response with 'cursor' parameter.
+
+	"""
+
+	page_size = 20
+	max_page_size = 100
+	page_size_query_param = "page_size"
+	ordering = "id"
+
+
+class MovieCursorPaginator(pagination.CursorPagination):
+	"""
+		cursor paginator for user movies. default ordering is last modified first
+		and can change with 'ordering' parameter to one of 'valid_orderings' like
+		movie/?ordering=name . next and previous pages are links in the response.
+
+	"""
+
+	page_size = 20
+	max_page_size = 100
+	page_size_query_param = "page_size"
+	ordering = "-date_and_time"
+	ordering_query_param = "ordering"
+	valid_orderings = ("date_and_time", "-date_and_time", "name", "-name")
+
+	def get_ordering(self, request, queryset, view):
+		ordering = request.query_params.get(self.ordering_query_param)
+		if ordering not in self.valid_orderings:
+			ordering = self.ordering
+		# pk as tie breaker so the order is stable
+		return (ordering, "-pk" if ordering.startswith("-") else "pk")
@@ -1,18 +1,25 @@
 from rest_framework import permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from .serializers import (
-	GroupSerializer, MovieSerializer, GroupMemberSerializer
+	GroupSerializer, MovieSerializer, GroupMemberSerializer, GROUP_MEMBER_FIELDS
 	)
 from .models import Group, Movie
 from .views_utils import (
-	all_movies_in_group, have_permission_for_group, is_admin_user
+	have_permission_for_group, is_admin_user, random_group_movie,
+	get_group_with_membership_or_404, group_movie_or_none, plan_movie_batch,
+	change_movie_count, save_changed_fields, resolve_profile_keys,
+	remove_group_members, user_dashboard, MOVIE_FIELDS
 	)
-from .utils import invite_code
+from .signals import movies_bulk_changed
+from .utils import invite_code, MemberCursorPaginator, MovieCursorPaginator
 from customauth.models import Profile
 from config.settings import MOVIE_PER_USER
-import random
 
 
 class CreateGroupView(APIView):
@@ -83,8 +90,12 @@ class EditAndDeleteGroupView(APIView):
 			----------
 			403 -> key="detail", value="you dont have permission to perform this action." : if user not group admin
 			400 -> key="detail", value="no new data provided." : if no field in request.data
+			400 -> key="detail", value={field: [errors]} : if a field value is not valid
+			400 -> key="detail", value="group with this name already exists."
+			400 -> key="detail", value="'users' should be an array of user keys."
+			400 -> [key="detail", value="users not found."], [key="users", value=Array (of unknown user keys)] : nothing is changed
 			404 -> key="detail", value="Not found." : if the given 'group_key' in the url is not refer to a Group object
-			200 -> ket="detail", value="modified"
+			200 -> [ket="detail", value="modified"], [key="removed", value=int (number of removed members)] : also when no field changed, then nothing is written
 
 			Input Types
 			----------
@@ -106,19 +117,35 @@ class EditAndDeleteGroupView(APIView):
 				status=status.HTTP_400_BAD_REQUEST,
 				data={"detail": "no new data provided."})
 
-		group = get_object_or_404(Group, key=group_key)
-		if "name" in request.data:
-			group.name = request.data["name"]
-		if "image" in request.data:
-			group.image = request.data["image"]
-		group.save()
-
+		# resolve every user key before changing anything so a bad key aborts the whole edit
+		profile_ids = []
 		if "users" in request.data:
 			users = request.data["users"]
-			for user in users:
-				profile = get_object_or_404(Profile, key=user)
-				profile.group.remove(group)
-		return Response(status=status.HTTP_200_OK, data={"detail": "modified"})
+			if not isinstance(users, list) or not all(isinstance(user, str) for user in users):
+				return Response(
+					status=status.HTTP_400_BAD_REQUEST,
+					data={"detail": "'users' should be an array of user keys."})
+			profile_ids, unknown = resolve_profile_keys(users)
+			if unknown:
+				return Response(
+					status=status.HTTP_400_BAD_REQUEST,
+					data={"detail": "users not found.", "users": unknown})
+
+		group = get_object_or_404(Group, key=group_key)
+		try:
+			with transaction.atomic():
+				save_changed_fields(group, request.data, ("name", "image"))
+				removed = remove_group_members(group, profile_ids) if profile_ids else 0
+		except ValidationError as ex:
+			return Response(
+				status=status.HTTP_400_BAD_REQUEST,
+				data={"detail": ex.message_dict})
+		except IntegrityError:
+			return Response(
+				status=status.HTTP_400_BAD_REQUEST,
+				data={"detail": "group with this name already exists."})
+		return Response(
+			status=status.HTTP_200_OK, data={"detail": "modified", "removed": removed})
 
 	def delete(self, request, group_key, format=None):
 		"""
@@ -153,7 +180,7 @@ class EditAndDeleteGroupView(APIView):
 
 
 class CreateAndGetMovieView(APIView):
-	""" on post add movie can include fields ["name", "description", "year", "imdb_rate", "download_link", "poster_link", "review"] and name is required. on get return all movies of user. """
+	""" on post add movie can include fields ["name", "description", "year", "imdb_rate", "download_link", "poster_link", "review"] and name is required. on get return movies of user page by page, filtered and ordered by url parameters. """
 	permission_classes = (permissions.IsAuthenticated, )
 
 	def post(self, request, format=None):
@@ -161,8 +188,7 @@ class CreateAndGetMovieView(APIView):
 			Attributes
 			----------
 			user -> django.contrib.auth.models.User(object) : authenticated user which sending the request
-			user_movies_count -> int : count all movies of the user
-			movie -> api.models.Movie(object) : contain movie object that get created with user data
+			movie -> api.models.Movie(object) : contain movie object that get created with user data, inserted only if a slot of the user Profile.movie_count is reserved
 
 			Responses
 			----------
@@ -190,22 +216,11 @@ class CreateAndGetMovieView(APIView):
 		"""
 
 		user = request.user
-		user_movies_count = Movie.objects.filter(user=user).count()
-		if user_movies_count >= MOVIE_PER_USER:
-			return Response(
-				status=status.HTTP_406_NOT_ACCEPTABLE,
-				data={"detail": "you reached the limit of adding movie. limit:{0}".format(MOVIE_PER_USER)})
-
 		if "name" not in request.data:
 			return Response(
 				status=status.HTTP_400_BAD_REQUEST, data={"detail": "'name' is required."})
 
-		if Movie.objects.filter(user=user, name=request.data["name"]).exists():
-			return Response(
-				status=status.HTTP_400_BAD_REQUEST,
-				data={"detail": "movie with this name already exists."})
-
-		movie = Movie.objects.create(name=request.data["name"], user=user)
+		movie = Movie(name=request.data["name"], user=user)
 		if "description" in request.data:
 			movie.description = request.data["description"]
 		if "year" in request.data:
@@ -219,7 +234,25 @@ class CreateAndGetMovieView(APIView):
 		if "review" in request.data:
 			movie.review = request.data["review"]
 
-		movie.save()
+		with transaction.atomic():
+			# reserve a slot of MOVIE_PER_USER, check and increment in one statement
+			if not change_movie_count(user, 1):
+				return Response(
+					status=status.HTTP_406_NOT_ACCEPTABLE,
+					data={"detail": "you reached the limit of adding movie. limit:{0}".format(MOVIE_PER_USER)})
+
+			# name uniqueness is the (user, name) unique constraint
+			movie.slot_reserved = True
+			try:
+				with transaction.atomic():
+					movie.save(force_insert=True)
+			except IntegrityError:
+				# give back the reserved slot
+				transaction.set_rollback(True)
+				return Response(
+					status=status.HTTP_400_BAD_REQUEST,
+					data={"detail": "movie with this name already exists."})
+
 		return Response(
 			status=status.HTTP_201_CREATED,
 			data={"detail": "movie '{0}' created".format(movie.name)})
@@ -229,19 +262,55 @@ class CreateAndGetMovieView(APIView):
 			Attributes
 			----------
 			user -> django.contrib.auth.models.User(object) : authenticated user which sending the request
-			movies -> django.db.models.query.QuerySet(object) : contain all user movies
-			serializer -> api.serializers.MovieSerializer(object) : contain serialized data of 'movies' queryset
+			filters -> dict : queryset filters made from url parameters
+			movies -> django.db.models.query.QuerySet(object) : contain filtered user movies
+			paginator -> api.utils.MovieCursorPaginator(object) : cursor paginator of movies
+			serializer -> api.serializers.MovieSerializer(object) : contain serialized data of the page
 
 			Responses
 			----------
-			200 -> serialized movies data in json
+			400 -> key="detail", value="'{0}' is not valid." : {0} is the url parameter with invalid value
+			200 -> [key="next", value=next page link], [key="previous", value=previous page link], [key="results", value=serialized movies]
+
+			Input Types
+			----------
+			all are optional url parameters like '?watched=false&year_min=2000&ordering=name'
+			watched -> String : "true" or "false"
+			year_min -> int
+			year_max -> int
+			imdb_rate_min -> float
+			ordering -> String : one of ["date_and_time", "-date_and_time", "name", "-name"] default "-date_and_time"
+			cursor -> String : taken from 'next' or 'previous' links
+			page_size -> int : max 100
 
 		"""
 
 		user = request.user
-		movies = user.movie.all()
-		serializer = MovieSerializer(instance=movies, many=True)
-		return Response(status=status.HTTP_200_OK, data=serializer.data)
+		params = request.query_params
+		filters = {}
+		if "watched" in params:
+			if params["watched"] not in ("true", "false"):
+				return Response(
+					status=status.HTTP_400_BAD_REQUEST,
+					data={"detail": "'watched' is not valid."})
+			filters["watched"] = params["watched"] == "true"
+		number_params = (
+			("year_min", "year__gte", int), ("year_max", "year__lte", int),
+			("imdb_rate_min", "imdb_rate__gte", float))
+		for param, lookup, cast in number_params:
+			if param in params:
+				try:
+					filters[lookup] = cast(params[param])
+				except ValueError:
+					return Response(
+						status=status.HTTP_400_BAD_REQUEST,
+						data={"detail": "'{0}' is not valid.".format(param)})
+
+		movies = Movie.objects.filter(user=user, **filters).select_related("user")
+		paginator = MovieCursorPaginator()
+		page = paginator.paginate_queryset(movies, request, view=self)
+		serializer = MovieSerializer(instance=page, many=True)
+		return paginator.get_paginated_response(serializer.data)
 
 
 class EditAndDeleteMovieView(APIView):
@@ -260,7 +329,9 @@ class EditAndDeleteMovieView(APIView):
 			404 -> key="detail", value="Not found." : if the given 'key' in the url is not refer to a movie object
 			401 -> key="detail", value="you dont have permission for this movie." : if user requesting dont match the movie owner
 			400 -> key="detail", value="no new data provided." : if there is no field in request.data
-			200 -> key="detail", value="updated"
+			400 -> key="detail", value={field: [errors]} : if a field value is not valid
+			400 -> key="detail", value="movie with this name already exists."
+			200 -> key="detail", value="updated" : also when no field changed, then nothing is written
 
 			Input Types
 			----------
@@ -291,23 +362,16 @@ class EditAndDeleteMovieView(APIView):
 				status=status.HTTP_400_BAD_REQUEST,
 				data={"detail": "no new data provided."})
 
-		if "name" in request.data:
-			movie.name = request.data["name"]
-		if "description" in request.data:
-			movie.description = request.data["description"]
-		if "year" in request.data:
-			movie.year = request.data["year"]
-		if "imdb_rate" in request.data:
-			movie.imdb_rate = request.data["imdb_rate"]
-		if "watched" in request.data:
-			movie.watched = request.data["watched"]
-		if "download_link" in request.data:
-			movie.download_link = request.data["download_link"]
-		if "poster_link" in request.data:
-			movie.poster_link = request.data["poster_link"]
-		if "review" in request.data:
-			movie.review = request.data["review"]
-		movie.save()
+		try:
+			save_changed_fields(movie, request.data, MOVIE_FIELDS)
+		except ValidationError as ex:
+			return Response(
+				status=status.HTTP_400_BAD_REQUEST,
+				data={"detail": ex.message_dict})
+		except IntegrityError:
+			return Response(
+				status=status.HTTP_400_BAD_REQUEST,
+				data={"detail": "movie with this name already exists."})
 		return Response(status=status.HTTP_200_OK, data={"detail": "updated"})
 
 	def delete(self, request, key, format=None):
@@ -337,12 +401,80 @@ class EditAndDeleteMovieView(APIView):
 				status=status.HTTP_403_FORBIDDEN,
 				data={"detail": "you dont have permission for this movie."})
 
+		# the slot is given back by api.signals
 		movie.delete()
 		return Response(
 			status=status.HTTP_200_OK,
 			data={"detail": "movie '{0}' deleted.".format(movie.name)})
 
 
+class BatchMovieView(APIView):
+	""" create, update and delete many movies of the authenticated user in one request. all operations are applied or none. """
+	permission_classes = (permissions.IsAuthenticated, )
+
+	def post(self, request, format=None):
+		"""
+			Attributes
+			----------
+			user -> django.contrib.auth.models.User(object) : authenticated user which sending the request
+			results -> list : one dict per operation with "index", "action", "key" and "errors" if invalid
+			creates, updates, deletes -> list : api.models.Movie(object)s to bulk create, bulk update and delete
+
+			Responses
+			----------
+			400 -> key="detail", value="an array of operations is required." : if request body is not a non empty array
+			400 -> [key="detail", value="no operation applied."], [key="results", value=results] : if any operation is invalid, invalid ones have "errors"
+			409 -> key="detail", value="movies changed by another request, no operation applied." : if a parallel request took the movie slots or names
+			200 -> [key="detail", value="done"], [key="results", value=results]
+
+			Input Types
+			----------
+			request.data -> Array of operations:
+				{"action": "create", "data": {"name": String, ...same optional fields as movie/ post}}
+				{"action": "update", "key": String, "data": {...same fields as movie/<key>/ put}}
+				{"action": "delete", "key": String}
+
+		"""
+
+		user = request.user
+		if not isinstance(request.data, list) or len(request.data) == 0:
+			return Response(
+				status=status.HTTP_400_BAD_REQUEST,
+				data={"detail": "an array of operations is required."})
+
+		results, creates, updates, deletes, update_fields = plan_movie_batch(user, request.data)
+		if any("errors" in result for result in results):
+			return Response(
+				status=status.HTTP_400_BAD_REQUEST,
+				data={"detail": "no operation applied.", "results": results})
+
+		try:
+			with transaction.atomic():
+				# deletes give their slots back through api.signals first
+				if deletes:
+					Movie.objects.filter(pk__in=[movie.pk for movie in deletes]).delete()
+				# the in memory quota check can be outdated by parallel requests, reserve for real
+				if not change_movie_count(user, len(creates)):
+					raise IntegrityError("movie limit reached")
+				if updates:
+					# bulk_update dont apply auto_now
+					now = timezone.now()
+					for movie in updates:
+						movie.date_and_time = now
+					Movie.objects.bulk_update(updates, list(update_fields) + ["date_and_time"])
+				if creates:
+					Movie.objects.bulk_create(creates)
+		except IntegrityError:
+			return Response(
+				status=status.HTTP_409_CONFLICT,
+				data={"detail": "movies changed by another request, no operation applied."})
+
+		if creates or updates:
+			movies_bulk_changed.send(
+				sender=Movie, user=user, keys=[movie.key for movie in creates + updates])
+		return Response(status=status.HTTP_200_OK, data={"detail": "done", "results": results})
+
+
 class GetRandomMovieView(APIView):
 	""" every user that is group member can get this. should include group key in url. """
 	permission_classes = (permissions.IsAuthenticated, )
@@ -352,16 +484,14 @@ class GetRandomMovieView(APIView):
 			Attributes
 			----------
 			user -> django.contrib.auth.models.User(object) : authenticated user which sending the request
-			all_group_movie_keys -> list : store value of all_movies_in_group function
-			selected_movie_key -> str : a random movie key choosed from all_group_movie_keys list
-			movie -> api.models.Movie(object) : contain Movie object , with selected_movie_key key
+			movie -> api.models.Movie(object) : a random unwatched movie of the group members, picked in the database by random_group_movie function
 			serializer -> api.serializers.MovieSerializer(object) : contain serialized data of 'movie'
 
 			Responses
 			----------
 			404 -> key="detail", value="Not found." : given group key object not found
 			401 -> key="detail", value="you dont have permission for this group." : if user not a member of group
-			404 -> key="detail", value="Not found." : if choosed movie as random corrupt or delete
+			404 -> key="detail", value="Not found." : if no group member has an unwatched movie
 			200 -> return serialized data of the choosed movie
 
 			Input Types
@@ -376,9 +506,7 @@ class GetRandomMovieView(APIView):
 				status=status.HTTP_401_UNAUTHORIZED,
 				data={"detail": "you dont have permission for this group."})
 
-		all_group_movie_keys = all_movies_in_group(key)
-		selected_movie_key = random.choice(all_group_movie_keys)
-		movie = get_object_or_404(Movie, key=selected_movie_key)
+		movie = random_group_movie(key)
 		serializer = MovieSerializer(instance=movie)
 		return Response(status=status.HTTP_200_OK, data=serializer.data)
 
@@ -391,33 +519,42 @@ class SubmitMovieView(APIView):
 		"""
 			Attributes
 			----------
+			group_obj -> api.models.Group(object) : group with given key annotated with 'is_member' of the authenticated user
+			movie_obj -> api.models.Movie(object) : the given movie if it is an unwatched movie of one of the group members
+
 			Responses
 			----------
+			404 -> key="detail", value="Not found." : if the given 'group' key in the url is not refer to a Group object
+			401 -> key="detail", value="you dont have permission for this group." : if user not a member of group
+			400 -> key="detail", value="movie not found as one of the group members movie." : if movie is not an unwatched movie of the group members
+			200 -> key="detail", value="'{0}' selected as movie of the week." : {0} is movie name
+
 			Input Types
 			----------
+			group -> String : in url
+			movie -> String : in url
 		"""
 
 		user = request.user
-		group_obj = get_object_or_404(Group, key=group)
-		if not have_permission_for_group(group, user):
+		group_obj = get_group_with_membership_or_404(group, user)
+		if not group_obj.is_member:
 			return Response(
 				status=status.HTTP_401_UNAUTHORIZED,
 				data={"detail": "you dont have permission for this group."})
 
-		all_movies_keys = all_movies_in_group(group)
-		if movie not in all_movies_keys:
+		movie_obj = group_movie_or_none(group_obj, movie)
+		if movie_obj is None:
 			return Response(
 				status=status.HTTP_400_BAD_REQUEST,
 				data={"detail": "movie not found as one of the group members movie."})
 
-		movie = get_object_or_404(Movie, key=movie)
-		group_obj.movie_of_the_week = movie
+		group_obj.movie_of_the_week = movie_obj
 		group_obj.save()
-		movie.watched = True
-		movie.save()
+		movie_obj.watched = True
+		movie_obj.save()
 		return Response(
 			status=status.HTTP_200_OK,
-			data={"detail": "'{0}' selected as movie of the week.".format(movie.name)})
+			data={"detail": "'{0}' selected as movie of the week.".format(movie_obj.name)})
 
 
 class AllUserGroups(APIView):
@@ -435,35 +572,86 @@ class AllUserGroups(APIView):
 		"""
 
 		user = request.user
-		groups = user.profile.group.all()
+		groups = Group.objects.filter(profile__user=user).select_related("admin")
 		serializer = GroupSerializer(instance=groups, many=True)
 		return Response(status=status.HTTP_200_OK, data=serializer.data)
 
 
+class UserGroupsDashboard(APIView):
+	""" return all groups of authenticated user with admin and movie of the week inlined, cached per user. """
+	permission_classes = (permissions.IsAuthenticated, )
+
+	def get(self, request, format=None):
+		"""
+			Attributes
+			----------
+			user -> django.contrib.auth.models.User(object) : authenticated user which sending the request
+
+			Responses
+			----------
+			200 -> Array of groups : every group with "key", "name", "admin", "image",
+			 "meeting_detail" and "movie_of_the_week" as a full movie (null if not selected)
+
+		"""
+
+		return Response(status=status.HTTP_200_OK, data=user_dashboard(request.user))
+
+
 class AllGroupMembersProfile(APIView):
-	""" return all group memebers of the group. group key should pass in url and available only for group members. """
+	""" return group memebers of the group page by page. group key should pass in url and available only for group members. """
 	permission_classes = (permissions.IsAuthenticated, )
 
 	def get(self, request, group_key, format=None):
 		"""
 			Attributes
 			----------
+			group -> api.models.Group(object) : group with the given key annotated with 'is_member' of the authenticated user
+			fields -> list : comma separated 'fields' parameter, if not provided all fields returned
+			members -> django.db.models.query.QuerySet(object) : group members profiles with their user and movies loaded in bulk
+			paginator -> api.utils.MemberCursorPaginator(object) : cursor paginator of members
+
 			Responses
 			----------
+			404 -> key="detail", value="Not found." : if the given 'group_key' in the url is not refer to a Group object
+			401 -> key="detail", value="you dont have permission for this group." : if user not a member of group
+			400 -> [key="detail", value="value '{0}' is not valid." {0} is the 'fields' parameter], [key="valid values", value=["key", "image", "username", "movies"]] : if 'fields' has an empty or unknown name
+			200 -> [key="next", value=next page link], [key="previous", value=previous page link], [key="results", value=serialized members]
+
 			Input Types
 			----------
+			group_key -> String : in url
+			fields -> String : optional url parameter, comma separated of ("key", "image", "username", "movies") like '?fields=key,image,username'
+			cursor -> String : optional url parameter, taken from 'next' or 'previous' links
+			page_size -> int : optional url parameter, max 100
 		"""
 
 		user = request.user
-		if not have_permission_for_group(group_key, user):
+		group = get_group_with_membership_or_404(group_key, user)
+		if not group.is_member:
 			return Response(
 				status=status.HTTP_401_UNAUTHORIZED,
 				data={"detail": "you dont have permission for this group."})
 
-		group = get_object_or_404(Group, key=group_key)
-		all_members = Profile.objects.filter(group=group)
-		group_serializer = GroupMemberSerializer(instance=all_members, many=True)
-		return Response(status=status.HTTP_200_OK, data=group_serializer.data)
+		fields = request.query_params.get("fields")
+		if fields is not None:
+			fields = fields.split(",")
+			# an empty or misspelled name is an error, not an empty member
+			if not set(fields) <= set(GROUP_MEMBER_FIELDS):
+				return Response(
+					status=status.HTTP_400_BAD_REQUEST,
+					data={"detail": "value '{0}' is not valid.".format(
+						request.query_params["fields"]),
+						"valid values": GROUP_MEMBER_FIELDS})
+
+		members = Profile.objects.filter(group=group).select_related("user")
+		if fields is None or "movies" in fields:
+			members = members.prefetch_related(
+				Prefetch("user__movie", queryset=Movie.objects.order_by("pk")))
+
+		paginator = MemberCursorPaginator()
+		page = paginator.paginate_queryset(members, request, view=self)
+		group_serializer = GroupMemberSerializer(instance=page, many=True, fields=fields)
+		return paginator.get_paginated_response(group_serializer.data)
 
 
 class GenerateInviteCode(APIView):
@@ -507,12 +695,13 @@ class JoinGroup(APIView):
 		"""
 
 		user = request.user
-		if not Group.objects.filter(invite_code=invite_code).exists():
+		# invite_code is unique, one indexed lookup
+		group = Group.objects.filter(invite_code=invite_code).first()
+		if group is None:
 			return Response(
 				status=status.HTTP_400_BAD_REQUEST,
 				data={"detail": "requested group does not exist, please inform the admin to generate a new key."})
 
-		group = get_object_or_404(Group, invite_code=invite_code)
 		user.profile.group.add(group)
 		return Response(
 			status=status.HTTP_200_OK,
@@ -535,7 +724,7 @@ class LeaveGroup(APIView):
 
 		user = request.user
 		group = get_object_or_404(Group, key=group_key)
-		if not user.profile.group.filter(group).exists():
+		if not user.profile.group.filter(pk=group.pk).exists():
 			return Response(
 				status=status.HTTP_400_BAD_REQUEST,
 				data={"detail": "you are not member of this group."})
@@ -1,17 +1,130 @@
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from .models import Group
-from itertools import chain
+from config.settings import (
+	GROUP_MOVIES_CACHE_TIMEOUT, USER_DASHBOARD_CACHE_TIMEOUT, MOVIE_PER_USER)
+from .models import Group, Movie
+from .cache_utils import (
+	group_movies_cache_key, invalidate_group_movies, invalidate_group_dashboard,
+	group_dashboard_versions, user_dashboard_cache_key)
+from .serializers import GroupDashboardSerializer
+from customauth.models import Profile
+import random
 
 
-def all_movies_in_group(key):
-	group = get_object_or_404(Group, key=key)
-	all_profiles = group.profile_set.all()
-	all_group_movies = []
-	for profile in all_profiles:
-		user_movies = profile.user.movie.filter(watched=False).values_list("key", flat=True)
-		all_group_movies.append(list(user_movies))
-	all_group_movie_keys = list(chain.from_iterable(all_group_movies))
-	return all_group_movie_keys
+def group_movies(key):
+	# unwatched movies of every member of the group in one joined query
+	return Movie.objects.filter(user__profile__group__key=key, watched=False)
+
+
+def cached_group_movie_keys(key):
+	# versioned per group pool, invalidated by the signals in api.signals
+	cache_key = group_movies_cache_key(key)
+	movie_keys = cache.get(cache_key)
+	if movie_keys is None:
+		movie_keys = tuple(group_movies(key).values_list("key", flat=True))
+		cache.set(cache_key, movie_keys, GROUP_MOVIES_CACHE_TIMEOUT)
+	return movie_keys
+
+
+def random_group_movie(key):
+	movie_keys = cached_group_movie_keys(key)
+	if len(movie_keys) == 0:
+		raise Http404
+	# the pool can be stale in other processes, so the pick is checked against
+	# the membership too, in the same query
+	movie = Movie.objects.select_related("user").filter(
+		key=random.choice(movie_keys), watched=False, user__profile__group__key=key).first()
+	if movie is not None:
+		return movie
+
+	# stale pool, drop it and sample in the database with count + offset
+	invalidate_group_movies(key)
+	movies = group_movies(key).select_related("user").order_by("pk")
+	count = movies.count()
+	if count == 0:
+		raise Http404
+	try:
+		return movies[random.randrange(count)]
+	except IndexError:
+		# the pool shrank between count and fetch
+		raise Http404
+
+
+def user_dashboard(user):
+	"""
+		serialized groups of the user with their admin and movie of the week, built
+		with one query and cached per user. the entry keeps the dashboard version of
+		every group in it, so a change of a group (see api.signals) makes it stale
+		for all the members without knowing who cached it. joining a group bumps the
+		user version in the cache key.
+
+	"""
+
+	cache_key = user_dashboard_cache_key(user.pk)
+	cached = cache.get(cache_key)
+	if cached is not None and group_dashboard_versions(cached["versions"]) == cached["versions"]:
+		return cached["groups"]
+
+	groups = list(
+		Group.objects.filter(profile__user=user)
+		.select_related("admin", "movie_of_the_week__user").order_by("pk"))
+	versions = group_dashboard_versions([group.key for group in groups])
+	data = GroupDashboardSerializer(instance=groups, many=True).data
+	cache.set(
+		cache_key, {"versions": versions, "groups": data}, USER_DASHBOARD_CACHE_TIMEOUT)
+	return data
+
+
+def change_movie_count(user, count, limit=True):
+	"""
+		add 'count' (can be negative) to the user Profile.movie_count in one
+		conditional update. returns False without change if the user would go over
+		MOVIE_PER_USER (unless 'limit' is False) or under 0, parallel requests can
+		not both pass because the check and the change are the same statement.
+		views reserve the slots of the movies they create before inserting them,
+		other creates and every delete are counted by api.signals.
+
+	"""
+	if count == 0:
+		return True
+	profiles = Profile.objects.filter(user=user)
+	if count > 0 and limit:
+		profiles = profiles.filter(movie_count__lte=MOVIE_PER_USER - count)
+	elif count < 0:
+		profiles = profiles.filter(movie_count__gte=-count)
+	return profiles.update(movie_count=F("movie_count") + count) == 1
+
+
+def refresh_movie_counts():
+	# recompute every Profile.movie_count, for data written around the views like bulk inserts
+	counts = Movie.objects.filter(user_id=OuterRef("user_id")).order_by().values(
+		"user_id").annotate(count=Count("pk")).values("count")
+	return Profile.objects.update(movie_count=Coalesce(Subquery(counts), 0))
+
+
+def group_movie_or_none(group, movie_key):
+	# the movie only if it is an unwatched movie of a group member, one query
+	return Movie.objects.filter(
+		key=movie_key, watched=False, user__profile__group=group).first()
+
+
+def get_group_with_membership_or_404(group_key, user):
+	# group and 'is_member' of the user in one query
+	membership = Profile.group.through.objects.filter(
+		group_id=OuterRef("pk"), profile__user_id=user.pk)
+	return get_object_or_404(
+		Group.objects.annotate(is_member=Exists(membership)), key=group_key)
+
+
+def share_group(user, other_user):
+	# intersection of both users 'Profile.group' rows in one query
+	return Group.objects.filter(profile__user=user).filter(
+		profile__user=other_user).exists()
 
 
 def have_permission_for_group(group_key, user):
@@ -25,3 +138,173 @@ def is_admin_user(group_key, user):
 	if group.admin != user:
 		return False
 	return True
+
+
+def resolve_profile_keys(keys):
+	# ids of the profiles with 'keys' in one query and the keys that match no profile
+	found = dict(Profile.objects.filter(key__in=keys).values_list("key", "pk"))
+	return list(found.values()), sorted(set(keys) - set(found))
+
+
+def remove_group_members(group, profile_ids):
+	"""
+		remove the profiles from the group with one DELETE on the membership table.
+		m2m_changed is not sent for it so the group movies cache is invalidated here.
+		returns the number of removed members.
+
+	"""
+	removed, _ = Profile.group.through.objects.filter(
+		group=group, profile_id__in=profile_ids).delete()
+	if removed:
+		invalidate_group_movies(group.key)
+		invalidate_group_dashboard(group.key)
+	return removed
+
+
+def save_changed_fields(instance, data, fields):
+	"""
+		set the 'fields' that are in 'data' on the instance and save only the ones
+		whose value changed, together with the auto_now fields of the model.
+		values are converted with the model field first so "2001" and 2001 are the
+		same year. nothing is written if no field changed.
+		returns the list of changed field names.
+		raise django.core.exceptions.ValidationError if a changed value is not valid
+		and django.db.IntegrityError if the save break a unique constraint.
+
+	"""
+
+	changed = []
+	errors = {}
+	for name in fields:
+		if name not in data:
+			continue
+		field = instance._meta.get_field(name)
+		try:
+			value = field.to_python(data[name])
+		except ValidationError as ex:
+			errors[name] = ex.messages
+			continue
+		if value != field.value_from_object(instance):
+			setattr(instance, name, value)
+			changed.append(name)
+	if errors:
+		raise ValidationError(errors)
+	if not changed:
+		return changed
+
+	instance.clean_fields(exclude=[
+		field.name for field in instance._meta.fields if field.name not in changed])
+	auto_now = [
+		field.name for field in instance._meta.concrete_fields
+		if getattr(field, "auto_now", False)]
+	# own savepoint so the caller can handle an IntegrityError and go on
+	with transaction.atomic():
+		instance.save(update_fields=changed + auto_now)
+	return changed
+
+
+MOVIE_FIELDS = (
+	"name", "description", "year", "imdb_rate", "watched", "download_link",
+	"poster_link", "review")
+
+
+def plan_movie_batch(user, operations):
+	"""
+		validate a list of movie operations of the user against MOVIE_PER_USER and
+		name uniqueness with the user movies loaded in one query.
+		operations are {"action": "create", "data": {...}},
+		{"action": "update", "key": ..., "data": {...}} and {"action": "delete", "key": ...}
+		returns (results, creates, updates, deletes, update_fields) where results
+		has one dict per operation with "errors" for the invalid ones and nothing
+		should be applied if any operation has errors.
+
+	"""
+
+	movies = {movie.key: movie for movie in Movie.objects.filter(user=user)}
+	# names before the batch, updates change the loaded movies in place
+	old_names = {movie.name: movie.key for movie in movies.values()}
+	results, creates, updates, deletes = [], [], [], []
+	update_fields = set()
+	touched = set()
+	for index, operation in enumerate(operations):
+		result = {"index": index}
+		results.append(result)
+		if not isinstance(operation, dict) or operation.get("action") not in ("create", "update", "delete"):
+			result["errors"] = {"action": "should be one of create, update, delete."}
+			continue
+		action = result["action"] = operation["action"]
+		data = operation.get("data", {})
+		if action != "create":
+			key = result["key"] = operation.get("key")
+			if not isinstance(key, str):
+				result["errors"] = {"key": "should be a movie key string."}
+				continue
+			if key not in movies:
+				result["errors"] = {"key": "movie not found."}
+				continue
+			if key in touched:
+				result["errors"] = {"key": "more than one operation for this movie."}
+				continue
+			touched.add(key)
+			if action == "delete":
+				deletes.append(movies[key])
+				continue
+		if not isinstance(data, dict) or (action == "update" and not data):
+			result["errors"] = {"data": "no new data provided."}
+			continue
+		unknown = set(data) - set(MOVIE_FIELDS) - ({"watched"} if action == "update" else set())
+		if action == "create":
+			unknown |= {"watched"} & set(data)
+			if "name" not in data:
+				result["errors"] = {"name": "'name' is required."}
+				continue
+		if unknown:
+			result["errors"] = {field: "unknown field." for field in unknown}
+			continue
+
+		movie = Movie(user=user) if action == "create" else movies[key]
+		for field, value in data.items():
+			setattr(movie, field, value)
+		try:
+			movie.clean_fields(exclude=["user", "key", "date_and_time"])
+		except ValidationError as ex:
+			result["errors"] = ex.message_dict
+			continue
+		if action == "create":
+			result["key"] = movie.key
+			creates.append(movie)
+		else:
+			updates.append(movie)
+			update_fields.update(data)
+
+	# names after the batch should be unique per user
+	deleted_keys = {movie.key for movie in deletes}
+	names = {}
+	for movie in movies.values():
+		if movie.key not in deleted_keys:
+			names.setdefault(movie.name, []).append(movie.key)
+	for movie in creates:
+		names.setdefault(movie.name, []).append(movie.key)
+	for result in results:
+		if "errors" not in result and result.get("action") in ("create", "update"):
+			movie_name = next(
+				movie.name for movie in creates + updates if movie.key == result["key"])
+			owner = old_names.get(movie_name, result["key"])
+			if len(names[movie_name]) > 1:
+				result["errors"] = {"name": "movie with this name already exists."}
+			elif result["action"] == "update" and owner != result["key"] and owner not in deleted_keys:
+				# the unique constraint is checked row by row while the updates are
+				# applied, a name freed by another update of the batch is still taken
+				result["errors"] = {
+					"name": "name of another movie renamed in this batch, rename them in separate requests."}
+
+	if len(movies) - len(deletes) + len(creates) > MOVIE_PER_USER:
+		for result in results:
+			if result.get("action") == "create" and "errors" not in result:
+				result["errors"] = {
+					"detail": "you reached the limit of adding movie. limit:{0}".format(MOVIE_PER_USER)}
+	for result in results:
+		# keys of movies that will not be created are meaningless
+		if result.get("action") == "create" and "errors" in result:
+			result.pop("key", None)
+	return results, creates, updates, deletes, update_fields
@@ -10,7 +10,7 @@ class PostAdmin(admin.ModelAdmin):
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-	list_display = ("name", "slug")
+	list_display = ("name", "slug", "post_count")
 	prepopulated_fields = {"slug": ("name", )}
 
 
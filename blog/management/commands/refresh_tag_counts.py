@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from blog.models import Tag
+
+
+class Command(BaseCommand):
+	help = "recompute Tag.post_count of every tag from the public posts tags rows."
+
+	def handle(self, *args, **options):
+		updated = Tag.objects.refresh_post_counts()
+		self.stdout.write("post_count of {0} tags refreshed.".format(updated))
@@ -1,13 +1,67 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Coalesce
 from api.utils import random_key
+from customauth.models import Profile
 from django.contrib.auth.models import User
 from .utils import post_images
 from django.utils.text import slugify
 
 
+def tag_slug(name):
+	# unicode slugs, ascii only slugify turns every persian name into ""
+	return slugify(name, allow_unicode=True)
+
+
+class TagManager(models.Manager):
+	def resolve(self, names):
+		"""
+			return Tag objects for the given names and create the missing ones.
+			existing tags are fetched in one query and missing ones inserted with one
+			bulk insert that ignore conflicts of parallel requests, then fetched by
+			name in one more query. raise ValidationError for names with an empty
+			slug or a slug that another tag already has, a name never resolve to a
+			different tag, and when 'names' is not a list of strings.
+
+		"""
+		if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+			raise ValidationError({"tags": ["'tags' should be an array of tag names."]})
+		names = set(names)
+		tags = list(self.filter(name__in=names))
+		missing = names - {tag.name for tag in tags}
+		if missing:
+			# bulk_create skip Tag.save so slug is set here
+			self.bulk_create(
+				[Tag(name=name, slug=tag_slug(name)) for name in missing if tag_slug(name)],
+				ignore_conflicts=True)
+			tags += list(self.filter(name__in=missing))
+			rejected = names - {tag.name for tag in tags}
+			if rejected:
+				raise ValidationError({"tags": [
+					"tag '{0}' has the same slug as another tag or an empty one.".format(name)
+					for name in sorted(rejected)]})
+		return tags
+
+	def refresh_post_counts(self):
+		"""
+			recompute every 'post_count' from the public posts tags rows in one
+			update. counts are kept up to date by blog.signals, this is for data
+			written without signals like bulk inserts or visibility updates.
+
+		"""
+		counts = Post.tags.through.objects.filter(
+			tag_id=models.OuterRef("pk"), post__visibility="all").order_by().values(
+			"tag_id").annotate(count=models.Count("pk")).values("count")
+		return self.update(post_count=Coalesce(models.Subquery(counts), 0))
+
+
 class Tag(models.Model):
 	name = models.CharField(max_length=50, unique=True)
-	slug = models.SlugField(unique=True)
+	slug = models.SlugField(unique=True, allow_unicode=True)
+	# number of public posts with this tag, maintained by blog.signals
+	post_count = models.PositiveIntegerField(default=0, db_index=True)
+
+	objects = TagManager()
 
 	def __str__(self):
 		return self.name
@@ -16,10 +70,47 @@ class Tag(models.Model):
 		"""
 			make sure onsave object name will auto slugify and add to slug field
 		"""
-		self.slug = slugify(self.name)
+		self.slug = tag_slug(self.name)
 		super(Tag, self).save(*args, **kwargs)
 
 
+def post_detail_prefetches():
+	"""
+		related objects PostSerializer need, tags and active comments with their
+		author and author profile.
+
+	"""
+	return (
+		"tags",
+		models.Prefetch(
+			"comments",
+			queryset=Comment.objects.filter(is_active=True).select_related("author__profile")))
+
+
+class PostQuerySet(models.QuerySet):
+	def visible_to(self, user):
+		"""
+			posts the user can see, all public posts, user own posts and group posts
+			of authors that share a group with the user.
+
+		"""
+		shared_group = Profile.group.through.objects.filter(
+			profile__user_id=models.OuterRef("author_id"), group__profile__user=user)
+		return self.annotate(shares_group=models.Exists(shared_group)).filter(
+			models.Q(visibility="all")
+			| models.Q(author=user)
+			| models.Q(visibility="group", shares_group=True))
+
+	def with_details(self):
+		"""
+			posts with everything PostSerializer need loaded in a fixed number of
+			queries no matter how many posts, tags or comments.
+
+		"""
+		return self.select_related("author__profile").prefetch_related(
+			*post_detail_prefetches())
+
+
 class Post(models.Model):
 	VISIBILITY_CHOICES = (
 		('draft', 'Draft'),
@@ -39,6 +130,16 @@ class Post(models.Model):
 	updated = models.DateTimeField(auto_now=True)
 	visits = models.PositiveIntegerField(default=0)
 
+	objects = PostQuerySet.as_manager()
+
+	class Meta:
+		indexes = [
+			# feeds filter by visibility and page by created
+			models.Index(fields=["visibility", "-created", "-id"], name="post_visibility_created_idx"),
+			# group feed filter by authors of the group
+			models.Index(fields=["author", "visibility", "-created"], name="post_author_visibility_idx"),
+		]
+
 	def __str__(self):
 		return self.title
 
@@ -53,5 +154,11 @@ class Comment(models.Model):
 	is_active = models.BooleanField(default=True)
 	created = models.DateTimeField(auto_now_add=True)
 
+	class Meta:
+		indexes = [
+			# post details prefetch the active comments of the posts
+			models.Index(fields=["post", "is_active"], name="comment_post_active_idx"),
+		]
+
 	def __str__(self):
 		return self.post.title
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Post, Tag, Comment
+from .visits import pending_visits
 from django.contrib.auth.models import User
 
 
@@ -9,6 +10,17 @@ class TagSerializer(serializers.ModelSerializer):
 		fields = ("name", "slug")
 
 
+class TagCountSerializer(serializers.ModelSerializer):
+	"""
+		tag with number of posts that have it, used in top tags endpoint.
+
+	"""
+
+	class Meta:
+		model = Tag
+		fields = ("name", "slug", "post_count")
+
+
 class AuthorSerializer(serializers.ModelSerializer):
 	"""
 		needed data from ahtor to send in PostSerializer and CommentSerializer is
@@ -54,12 +66,17 @@ class PostSerializer(serializers.ModelSerializer):
 		their serializers to access the related data.
 		'comments' are backward relational queryset.
 		original should be comment_set but renamed to comments in models.comment
+		'visits' include the visits that are buffered and not written yet.
 
 	"""
 
 	tags = TagSerializer(many=True)
 	author = AuthorSerializer()
 	comments = CommentSerializer(many=True)
+	visits = serializers.SerializerMethodField()
+
+	def get_visits(self, obj):
+		return obj.visits + pending_visits(obj.pk)
 
 	class Meta:
 		model = Post
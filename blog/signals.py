@@ -0,0 +1,68 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Post, Tag
+
+# Tag.post_count only counts posts with this visibility, the others are not
+# public and their tags should not show in the top tags
+COUNTED_VISIBILITY = "all"
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+	"""
+		keep Tag.post_count in step with the public posts tags rows. 'pk_set' of
+		post_add only contain the newly added rows.
+
+	"""
+	if action == "post_add":
+		change = 1
+	elif action in ("post_remove", "pre_clear"):
+		change = -1
+	else:
+		return
+
+	if reverse:
+		# instance is the Tag and pk_set are posts
+		if action == "pre_clear":
+			posts = instance.post_set.all()
+		else:
+			posts = Post.objects.filter(pk__in=pk_set)
+		count = posts.filter(visibility=COUNTED_VISIBILITY).count()
+		Tag.objects.filter(pk=instance.pk).update(post_count=F("post_count") + change * count)
+		return
+
+	if instance.visibility != COUNTED_VISIBILITY:
+		return
+	if action == "pre_clear":
+		tags = Tag.objects.filter(post=instance)
+	else:
+		tags = Tag.objects.filter(pk__in=pk_set)
+	tags.update(post_count=F("post_count") + change)
+
+
+@receiver(post_init, sender=Post)
+def remember_visibility(sender, instance, **kwargs):
+	# from __dict__ so a deferred visibility is not loaded
+	instance._saved_visibility = instance.__dict__.get("visibility")
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, update_fields, **kwargs):
+	""" a post that becomes public or stops being public changes the count of its tags. """
+	if update_fields is not None and "visibility" not in update_fields:
+		return
+	was_counted = instance._saved_visibility == COUNTED_VISIBILITY
+	is_counted = instance.visibility == COUNTED_VISIBILITY
+	instance._saved_visibility = instance.visibility
+	if created or was_counted == is_counted:
+		return
+	Tag.objects.filter(post=instance).update(
+		post_count=F("post_count") + (1 if is_counted else -1))
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+	# posts tags rows are deleted without m2m_changed
+	Tag.objects.filter(post=instance, post__visibility=COUNTED_VISIBILITY).update(
+		post_count=F("post_count") - 1)
@@ -0,0 +1,204 @@
+from api.benchmark import BudgetTestCase
+from blog.models import Post, Comment, Tag
+from blog.visits import flush_visits, pending_visits
+
+
+class BlogEndpointBudgetTests(BudgetTestCase):
+	""" query-count and wall-time budgets of blog/urls.py endpoints. """
+
+	def setUp(self):
+		super(BlogEndpointBudgetTests, self).setUp()
+		self.member = self.data["member"]
+		self.group_post = self.data["group_post"]
+		self.authenticate(self.member)
+
+	def test_create_post(self):
+		self.assertWithinBudget(
+			"blog:post-create", "post", "/v1/blog/post/", queries=11, status=201,
+			data={
+				"title": "new post", "body": "body", "visibility": "all",
+				"tags": ["tag1", "tag2", "tag3", "new tag1", "new tag2"]})
+
+	def test_create_post_persian_tags(self):
+		# both names slugify to "" without unicode, the second post must not get the first tag
+		for title, name in (("first", "فیلم"), ("second", "سینما")):
+			self.client.post("/v1/blog/post/", format="json", data={
+				"title": title, "body": "body", "visibility": "all", "tags": [name]})
+		for title, name in (("first", "فیلم"), ("second", "سینما")):
+			tag = Tag.objects.get(name=name)
+			self.assertEqual(tag.post_count, 1)
+			self.assertEqual(
+				list(Post.objects.filter(tags=tag).values_list("title", flat=True)), [title])
+
+	def test_create_post_slug_collision(self):
+		# "Tag1" has the slug of "tag1" and "!!" an empty one, no post or tag is created
+		posts = Post.objects.count()
+		for name in ("Tag1", "!!"):
+			response = self.client.post("/v1/blog/post/", format="json", data={
+				"title": "new post", "body": "body", "visibility": "all",
+				"tags": ["tag2", name]})
+			self.assertEqual(response.status_code, 400)
+			self.assertIn("tags", response.data["detail"])
+			self.assertFalse(Tag.objects.filter(name=name).exists())
+		self.assertEqual(Post.objects.count(), posts)
+
+	def test_create_post_tags_not_names(self):
+		posts = Post.objects.count()
+		for tags in ("abc", [{"a": 1}], ["tag1", 2]):
+			response = self.client.post("/v1/blog/post/", format="json", data={
+				"title": "new post", "body": "body", "visibility": "all", "tags": tags})
+			self.assertEqual(response.status_code, 400)
+			self.assertIn("tags", response.data["detail"])
+		self.assertFalse(Tag.objects.filter(name__in=("a", "b", "c")).exists())
+		self.assertEqual(Post.objects.count(), posts)
+
+	def test_get_user_posts(self):
+		self.assertWithinBudget(
+			"blog:post-list", "get", "/v1/blog/post/", queries=4, status=200)
+
+	def test_edit_post(self):
+		post = Post.objects.filter(author=self.member).order_by("pk").first()
+		self.assertWithinBudget(
+			"blog:post-edit", "put", "/v1/blog/post/{0}/".format(post.key),
+			queries=15, status=200,
+			data={"title": "edited", "tags": ["tag4", "tag5", "new tag3"]})
+
+	def test_edit_post_unchanged(self):
+		post = Post.objects.filter(author=self.member).order_by("pk").first()
+		self.assertWithinBudget(
+			"blog:post-edit-unchanged", "put", "/v1/blog/post/{0}/".format(post.key),
+			queries=5, status=200, data={"title": post.title, "body": post.body})
+		self.assertEqual(Post.objects.get(pk=post.pk).updated, post.updated)
+
+	def test_delete_post(self):
+		post = Post.objects.filter(author=self.member).order_by("pk").first()
+		self.assertWithinBudget(
+			"blog:post-delete", "delete", "/v1/blog/post/{0}/".format(post.key),
+			queries=8, status=200)
+
+	def test_all_public_posts(self):
+		self.assertWithinBudget(
+			"blog:posts-public", "get", "/v1/blog/posts/all/", queries=2, status=200)
+
+	def test_desired_post(self):
+		self.assertWithinBudget(
+			"blog:post-detail", "get", "/v1/blog/posts/{0}/".format(self.group_post.key),
+			queries=5, status=200)
+
+	def test_desired_post_visits(self):
+		visits = self.group_post.visits
+		response = self.client.get("/v1/blog/posts/{0}/".format(self.group_post.key))
+		# buffered, not written yet but already shown
+		self.assertEqual(pending_visits(self.group_post.pk), 1)
+		self.assertEqual(Post.objects.get(pk=self.group_post.pk).visits, visits)
+		self.assertEqual(response.data["visits"], visits + 1)
+		flush_visits()
+		self.assertEqual(pending_visits(self.group_post.pk), 0)
+		self.assertEqual(Post.objects.get(pk=self.group_post.pk).visits, visits + 1)
+
+	def test_desired_post_restricted(self):
+		self.authenticate(self.data["outsider"])
+		self.assertWithinBudget(
+			"blog:post-detail-restricted", "get",
+			"/v1/blog/posts/{0}/".format(self.group_post.key), queries=3, status=403)
+
+	def test_group_posts(self):
+		self.assertWithinBudget(
+			"blog:posts-group", "get",
+			"/v1/blog/posts/group/{0}/".format(self.data["group"].key),
+			queries=3, status=200)
+
+	def test_group_posts_once_over_pages(self):
+		# 'author' is in many groups, the member joins some more of them
+		author = self.data["author"]
+		self.member.profile.group.add(*author.profile.group.exclude(pk=self.data["group"].pk)[:3])
+		expected = set(Post.objects.filter(
+			author__profile__group=self.data["group"], visibility="group").values_list("key", flat=True))
+		self.assertIn(self.group_post.key, expected)
+
+		keys, pages = [], 0
+		url = "/v1/blog/posts/group/{0}/?page_size={1}".format(
+			self.data["group"].key, len(expected) // 2 + 1)
+		while url:
+			response = self.client.get(url)
+			self.assertEqual(response.status_code, 200)
+			keys += [post["key"] for post in response.data["results"]]
+			url = response.data["next"]
+			pages += 1
+		self.assertEqual(pages, 2)
+		self.assertEqual(len(keys), len(set(keys)))
+		self.assertEqual(set(keys), expected)
+
+	def test_create_comment(self):
+		self.assertWithinBudget(
+			"blog:comment-create", "post",
+			"/v1/blog/comment/create/{0}/".format(self.group_post.key),
+			queries=4, status=201, data={"body": "new comment"})
+
+	def test_edit_comment(self):
+		comment = Comment.objects.filter(author=self.member).order_by("pk").first()
+		self.assertWithinBudget(
+			"blog:comment-edit", "put", "/v1/blog/comment/{0}/".format(comment.key),
+			queries=5, status=200, data={"body": "edited"})
+
+	def test_delete_comment(self):
+		comment = Comment.objects.filter(author=self.member).order_by("pk").first()
+		self.assertWithinBudget(
+			"blog:comment-delete", "delete", "/v1/blog/comment/{0}/".format(comment.key),
+			queries=7, status=200)
+
+	def test_tag_posts(self):
+		self.assertWithinBudget(
+			"blog:tag-posts", "get", "/v1/blog/tags/tag1/posts/", queries=3, status=200)
+
+	def test_top_tags(self):
+		response = self.assertWithinBudget(
+			"blog:tags-top", "get", "/v1/blog/tags/top/", queries=2, status=200)
+		counts = [tag["post_count"] for tag in response.data]
+		self.assertEqual(counts, sorted(counts, reverse=True))
+
+	def test_top_tags_public_only(self):
+		def top_tags():
+			response = self.client.get("/v1/blog/tags/top/?limit=100")
+			return {tag["name"]: tag["post_count"] for tag in response.data}
+
+		self.client.post("/v1/blog/post/", format="json", data={
+			"title": "draft", "body": "body", "visibility": "draft", "tags": ["secret"]})
+		post = Post.objects.get(tags__name="secret")
+		self.assertEqual(Tag.objects.get(name="secret").post_count, 0)
+		self.assertNotIn("secret", top_tags())
+		self.client.put(
+			"/v1/blog/post/{0}/".format(post.key), format="json", data={"visibility": "all"})
+		self.assertEqual(Tag.objects.get(name="secret").post_count, 1)
+		self.client.put(
+			"/v1/blog/post/{0}/".format(post.key), format="json", data={"visibility": "group"})
+		self.assertEqual(Tag.objects.get(name="secret").post_count, 0)
+		Tag.objects.refresh_post_counts()
+		self.assertEqual(Tag.objects.get(name="secret").post_count, 0)
+
+
+class BlogQueryPlanTests(BudgetTestCase):
+	""" feeds and key-based blog routes should find their rows through indexes, not full scans. """
+
+	def setUp(self):
+		super(BlogQueryPlanTests, self).setUp()
+		self.member = self.data["member"]
+		self.group_post = self.data["group_post"]
+		self.authenticate(self.member)
+
+	def test_feeds(self):
+		self.assertIndexed("blog:posts-public", "get", "/v1/blog/posts/all/", status=200)
+		self.assertIndexed(
+			"blog:posts-group", "get",
+			"/v1/blog/posts/group/{0}/".format(self.data["group"].key), status=200)
+		self.assertIndexed(
+			"blog:tag-posts", "get", "/v1/blog/tags/tag1/posts/", status=200)
+
+	def test_post_routes(self):
+		self.assertIndexed(
+			"blog:post-detail", "get", "/v1/blog/posts/{0}/".format(self.group_post.key),
+			status=200)
+		self.assertIndexed(
+			"blog:comment-create", "post",
+			"/v1/blog/comment/create/{0}/".format(self.group_post.key), status=201,
+			data={"body": "new comment"})
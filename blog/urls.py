@@ -1,7 +1,8 @@
 from django.urls import path
 from .views import (
 	CreateAndGetUserPost, EditAndDeletePost, AllPublicPostsPaginated, DesiredPost,
-	GroupPublicPostsPaginated, CreateComment, EditAndDeleteComment)
+	GroupPublicPostsPaginated, CreateComment, EditAndDeleteComment, TagPostsPaginated,
+	TopTags)
 
 app_name = "blog"
 
@@ -13,5 +14,7 @@ urlpatterns = [
 	path("posts/group/<str:group_key>/", GroupPublicPostsPaginated.as_view()),
 	path("comment/create/<str:post_key>/", CreateComment.as_view()),
 	path("comment/<str:comment_key>/", EditAndDeleteComment.as_view()),
+	path("tags/top/", TopTags.as_view()),
+	path("tags/<str:slug>/posts/", TagPostsPaginated.as_view()),
 
 ]
@@ -16,14 +16,16 @@ def post_images(instance, filename):
 	return path
 
 
-class CustomPaginator(pagination.PageNumberPagination):
+class PostCursorPaginator(pagination.CursorPagination):
 	"""
-		paginator object used for posts/all/ endpoint so that all of the data wont
-		load at once and load them page by page. page_size is 30 now and can access
-		next page by passing page parameter in the url like : posts/all/?page=2
+		keyset paginator for posts feeds. pages are positioned by 'created' (and
+		'id' as tie breaker) of the last post, so there is no count query and no
+		growing offset and new posts dont shift the pages. page_size is 30 and next
+		page is the 'next' link in the response like : posts/all/?cursor=cD0yMDIx
 
 	"""
 
-	max_page_size = 100
 	page_size = 30
-	page_query_param = "page"
+	max_page_size = 100
+	page_size_query_param = "page_size"
+	ordering = ("-created", "-id")
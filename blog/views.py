@@ -1,11 +1,18 @@
 from rest_framework.response import Response
 from rest_framework import status, permissions, generics
 from rest_framework.views import APIView
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.shortcuts import get_object_or_404
-from .models import Post, Tag, Comment
-from api.models import Group
-from .serializers import PostSerializer, DemoPostSerializer, CommentSerializer
-from .utils import CustomPaginator
+from .models import Post, Tag, Comment, post_detail_prefetches
+from api.my_permissions import IsGroupMemberOfAuthor
+from api.views_utils import get_group_with_membership_or_404, save_changed_fields
+from customauth.models import Profile
+from .serializers import (
+	PostSerializer, DemoPostSerializer, CommentSerializer, TagCountSerializer)
+from .utils import PostCursorPaginator
+from .visits import record_visit
 
 
 class CreateAndGetUserPost(APIView):
@@ -26,12 +33,12 @@ class CreateAndGetUserPost(APIView):
 			required_fields -> list : list of required fields should be in request.data
 			valid_visibilities -> list : list of visibilities that user can use in request.data
 			post -> Post(object) : include the post object that create with user provided data
-			tag_obj -> Tag(object) : contain user desired tag object
 
 			Responses
 			----------
 			400 -> key="detail", value="field '{0}' is required." {0} can be : ["title", "body", "visibility"]
 			400 -> [key="detail", value="value '{0}' is not valid." {0} is request.data["visibility"] provided by user], [key="valid values", value=["draft", "group", "all"]]
+			400 -> key="detail", value={"tags": [errors]} : if a tag name has an empty slug or the slug of another tag
 			201 -> key="detail", value="post created."
 
 			Input Types
@@ -64,7 +71,7 @@ class CreateAndGetUserPost(APIView):
 					request.data["visibility"]), "valid values": valid_visibilities})
 
 		# create a post object in database with the given data
-		post = Post.objects.create(
+		post = Post(
 			title=request.data["title"],
 			body=request.data["body"],
 			visibility=request.data["visibility"],
@@ -73,18 +80,17 @@ class CreateAndGetUserPost(APIView):
 		# 'image' and 'tags' are two optional fields. chack if provided then add them to the 'post' object
 		if "image" in request.data:
 			post.image = request.data["image"]
-		if "tags" in request.data:
-			# request.data["tags"] is a json array. iterate in the list and if exist add them to the object.
-			for tag in request.data["tags"]:
-				# if tags dont exist create one
-				try:
-					tag_obj = Tag.objects.get(name=tag)
-				except Tag.DoesNotExist:
-					tag_obj = Tag.objects.create(name=tag)
-				# add tag to ManyToMany field with name 'tags'
-				post.tags.add(tag_obj)
-		# save 'image' and 'tags' if provided
-		post.save()
+		try:
+			with transaction.atomic():
+				post.save()
+				if "tags" in request.data:
+					# request.data["tags"] is a json array. get existing and create missing tags in bulk and add them at once
+					post.tags.add(*Tag.objects.resolve(request.data["tags"]))
+		except ValidationError as ex:
+			# the post is not created when a tag name is rejected
+			return Response(
+				status=status.HTTP_400_BAD_REQUEST,
+				data={"detail": ex.message_dict})
 
 		return Response(
 			status=status.HTTP_201_CREATED, data={"detail": "post created."})
@@ -103,8 +109,8 @@ class CreateAndGetUserPost(APIView):
 
 		"""
 		user = request.user
-		# get all posts that author is 'user'
-		posts = Post.objects.filter(author=user)
+		# get all posts that author is 'user' with tags, comments and authors loaded in bulk
+		posts = Post.objects.with_details().filter(author=user)
 		# serialize the object with 'many=True' allow us to serialize a queryset of post
 		serializer = PostSerializer(instance=posts, many=True)
 		return Response(status=status.HTTP_200_OK, data=serializer.data)
@@ -134,7 +140,8 @@ class EditAndDeletePost(APIView):
 			403 -> key="detail", value="you dont have permission to perform this action." : if user sending the request not post author
 			400 -> key="detail", value="no new data provided." : if not key exist in request.data
 			400 -> [key="detail", value="value '{0}' is not valid." {0} is request.data["visibility"] provided by user], [key="valid values", value=["draft", "group", "all"]]
-			200 -> key="detail", value="updated"
+			400 -> key="detail", value={field: [errors]} : if a field value or a tag name is not valid
+			200 -> key="detail", value="updated" : also when nothing changed, then nothing is written
 
 			Input Types
 			----------
@@ -166,11 +173,7 @@ class EditAndDeletePost(APIView):
 				status=status.HTTP_400_BAD_REQUEST,
 				data={"detail": "no new data provided."})
 
-		# all the fields sending are optional so we check for every of them are included or not
-		if "title" in request.data:
-			post.title = request.data["title"]
-		if "body" in request.data:
-			post.body = request.data["body"]
+		# all the fields sending are optional, visibility is checked here to keep its error message
 		if "visibility" in request.data:
 			valid_visibilities = ["draft", "group", "all"]
 
@@ -182,21 +185,18 @@ class EditAndDeletePost(APIView):
 						request.data["visibility"]),
 						"valid values": valid_visibilities})
 
-			post.visibility = request.data["visibility"]
-		if "image" in request.data:
-			post.image = request.data["image"]
-
-		# request.data["tags"] is a json array. iterate in the list and if exist add them to the object.
-		if "tags" in request.data:
-			for tag in request.data["tags"]:
-				try:
-					tag_obj = Tag.objects.get(name=tag)
-				except Tag.DoesNotExist:
-					tag_obj = Tag.objects.create(name=tag)
-				post.tags.add(tag_obj)
-
-		# save fields that modified
-		post.save()
+		try:
+			with transaction.atomic():
+				# save only the fields that changed, no write if none did
+				save_changed_fields(post, request.data, ("title", "body", "visibility", "image"))
+				# request.data["tags"] is a json array. get existing and create missing tags in bulk and add them at once
+				if "tags" in request.data:
+					post.tags.add(*Tag.objects.resolve(request.data["tags"]))
+		except ValidationError as ex:
+			# nothing is written when a field value or a tag name is rejected
+			return Response(
+				status=status.HTTP_400_BAD_REQUEST,
+				data={"detail": ex.message_dict})
 		return Response(status=status.HTTP_200_OK, data={"detail": "updated"})
 
 	def delete(self, request, post_key, format=None):
@@ -229,29 +229,28 @@ class EditAndDeletePost(APIView):
 
 class AllPublicPostsPaginated(generics.ListAPIView):
 	"""
-		return all posts with 'visibility="all"'
-		to prevent load all data at once add paginatior .
-		with scroll should get next page for that pass parameter 'page' to url like
-		'.../?page=2'.
+		return all posts with 'visibility="all"' newest first.
+		to prevent load all data at once add cursor paginatior .
+		with scroll should get next page for that request the 'next' link of the
+		response like '.../?cursor=cD0yMDIx'.
 	"""
 	permission_classes = (permissions.IsAuthenticated, )
-	queryset = Post.objects.filter(visibility="all")
+	queryset = Post.objects.filter(visibility="all").select_related("author__profile")
 	serializer_class = DemoPostSerializer
-	# paginator class is defined in .utils.py . 'page_size' = 5 and page parameter to access difrent pages is 'page'
-	pagination_class = CustomPaginator
+	# paginator class is defined in .utils.py . 'page_size' = 30 and ordered by ("-created", "-id")
+	pagination_class = PostCursorPaginator
 
 
 class DesiredPost(APIView):
 	"""
 		return all data of the desierd post. post key should pass in url.
 	"""
-	permission_classes = (permissions.IsAuthenticated, )
+	permission_classes = (permissions.IsAuthenticated, IsGroupMemberOfAuthor)
 
 	def get(self, request, post_key, format=None):
 		"""
 			Attributes
 			----------
-			user -> django.contrib.auth.models.User(object) : authenticated user which sending the request
 			post -> blog.models.Post(object) : contain post object that 'post_key' provided key in the url if not exist return 404
 			serializer -> blog.serializers.PostSerializer(object) : contain serialized data of 'post' object
 
@@ -265,37 +264,21 @@ class DesiredPost(APIView):
 			----------
 			post_key -> String : in the url
 		"""
-		user = request.user
-		post = get_object_or_404(Post, key=post_key)
-		# check if the desiered post restricted to the group members
-		if post.visibility == "group":
-			# all geoups that author of the post is member of them
-			author_groups = post.author.profile.group.all()
-			# store if user is in the authors group or not
-			is_member = []
-			for igroup in author_groups:
-				# check if any of user group key is equal to igroup.key. if it was append "True" to "is_member" else append "False"
-				if user.profile.group.filter(key=igroup.key).exists():
-					is_member.append(True)
-				else:
-					is_member.append(False)
-			# if not user is member of at least one of author group return forbiden response
-			if not any(is_member):
-				return Response(
-					status=status.HTTP_403_FORBIDDEN,
-					data={"detail": "this post is restricted to group and you are not part of the group."})
-		# else return the proper serialized json object
+		post = get_object_or_404(Post.objects.select_related("author__profile"), key=post_key)
+		# group restricted posts are only for users sharing a group with the author, see IsGroupMemberOfAuthor
+		self.check_object_permissions(request, post)
+		# load tags and comments only when the post is allowed
+		prefetch_related_objects([post], *post_detail_prefetches())
 		serializer = PostSerializer(instance=post)
-		# and also add 1 to visits
-		post.visits += 1
-		post.save()
+		# and also add 1 to visits, buffered and written in bulk by .visits
+		record_visit(post.pk)
 		return Response(status=status.HTTP_200_OK, data=serializer.data)
 
 
 class GroupPublicPostsPaginated(APIView):
 	"""
-		return all posts with 'visibility="group"'
-		in the given group key . group_key should pass in url
+		return posts with 'visibility="group"' of the given group members newest
+		first and page by page. group_key should pass in url
 	"""
 	permission_classes = (permissions.IsAuthenticated, )
 
@@ -304,32 +287,40 @@ class GroupPublicPostsPaginated(APIView):
 			Attributes
 			----------
 			user -> django.contrib.auth.models.User(object) : authenticated user which sending the request
-			group -> api.models.Group(object) : the group object that group_key sent as parameter
-			posts -> django.db.models.query.QuerySet(object) : contain all posts with 'visibility="group"' and where author is part of the group
-			serializer -> blog.serializers.DemoPostSerializer(object) : contain serialized object with "many='True'"
+			group -> api.models.Group(object) : the group object that group_key sent as parameter annotated with 'is_member' of the user
+			members -> django.db.models.query.QuerySet(object) : user ids of the group members, used as subquery
+			posts -> django.db.models.query.QuerySet(object) : contain posts with 'visibility="group"' and where author is part of the group, each post once
+			paginator -> blog.utils.PostCursorPaginator(object) : cursor paginator of the posts
+			serializer -> blog.serializers.DemoPostSerializer(object) : contain serialized page with "many='True'"
 
 			Responses
 			----------
-			400 -> key="detail", value="you are not member of this group." : if user is not member of the group that group_key passed in the url
 			404 -> key="detail", value="Not found." : if the group with the given group_key not found
-			200 -> return serialized data
+			400 -> key="detail", value="you are not member of this group." : if user is not member of the group that group_key passed in the url
+			200 -> [key="next", value=next page link], [key="previous", value=previous page link], [key="results", value=serialized posts]
 
 			Input Types
 			----------
 			group_key -> String : in the url
+			cursor -> String : optional url parameter, taken from 'next' or 'previous' links
+			page_size -> int : optional url parameter, max 100
 		"""
 		user = request.user
-		# check if user is member of group
-		if not user.profile.group.filter(key=group_key).exists():
+		# get the group and check if user is member of group in one query
+		group = get_group_with_membership_or_404(group_key, user)
+		if not group.is_member:
 			return Response(
 				status=status.HTTP_400_BAD_REQUEST,
 				data={"detail": "you are not member of this group."})
 
-		group = get_object_or_404(Group, key=group_key)
-		# queryset of posts that theyre author is part of the given group and visibility is "group" restricted
-		posts = Post.objects.filter(author__profile__group=group, visibility="group")
-		serializer = DemoPostSerializer(instance=posts, many=True)
-		return Response(status=status.HTTP_200_OK, data=serializer.data)
+		# 'author__in' subquery instead of a join so authors in many groups dont duplicate posts
+		members = Profile.objects.filter(group=group).values("user_id")
+		posts = Post.objects.filter(
+			author__in=members, visibility="group").select_related("author__profile")
+		paginator = PostCursorPaginator()
+		page = paginator.paginate_queryset(posts, request, view=self)
+		serializer = DemoPostSerializer(instance=page, many=True)
+		return paginator.get_paginated_response(serializer.data)
 
 
 class CreateComment(APIView):
@@ -455,3 +446,74 @@ class EditAndDeleteComment(APIView):
 
 		comment.delete()
 		return Response(status=status.HTTP_200_OK, data={"detail": "deleted"})
+
+
+class TagPostsPaginated(APIView):
+	"""
+		return posts with the given tag that the authenticated user can see newest
+		first and page by page. tag slug should pass in url.
+	"""
+	permission_classes = (permissions.IsAuthenticated, )
+
+	def get(self, request, slug, format=None):
+		"""
+			Attributes
+			----------
+			tag -> blog.models.Tag(object) : tag object with the given slug
+			posts -> django.db.models.query.QuerySet(object) : posts with the tag that are public, owned by the user or group posts of authors sharing a group with the user
+			paginator -> blog.utils.PostCursorPaginator(object) : cursor paginator of the posts
+
+			Responses
+			----------
+			404 -> key="detail", value="Not found." : if the tag with the given slug not found
+			200 -> [key="next", value=next page link], [key="previous", value=previous page link], [key="results", value=serialized posts]
+
+			Input Types
+			----------
+			slug -> String : in the url
+			cursor -> String : optional url parameter, taken from 'next' or 'previous' links
+			page_size -> int : optional url parameter, max 100
+		"""
+		tag = get_object_or_404(Tag, slug=slug)
+		posts = Post.objects.visible_to(request.user).filter(
+			tags=tag).select_related("author__profile")
+		paginator = PostCursorPaginator()
+		page = paginator.paginate_queryset(posts, request, view=self)
+		serializer = DemoPostSerializer(instance=page, many=True)
+		return paginator.get_paginated_response(serializer.data)
+
+
+class TopTags(APIView):
+	"""
+		return most used tags with their public posts count, tags of only draft
+		or group posts are not listed. optional 'limit' parameter in url, default
+		20 and max 100.
+	"""
+	permission_classes = (permissions.IsAuthenticated, )
+
+	def get(self, request, format=None):
+		"""
+			Attributes
+			----------
+			limit -> int : number of tags to return
+			tags -> django.db.models.query.QuerySet(object) : tags ordered by the maintained 'post_count' of public posts
+
+			Responses
+			----------
+			400 -> key="detail", value="'limit' should be a number." : if limit is not a number
+			200 -> return list of serialized tags with name, slug and post_count
+
+			Input Types
+			----------
+			limit -> int : optional url parameter like '?limit=50'
+		"""
+		try:
+			limit = min(int(request.query_params.get("limit", 20)), 100)
+		except ValueError:
+			return Response(
+				status=status.HTTP_400_BAD_REQUEST,
+				data={"detail": "'limit' should be a number."})
+
+		tags = Tag.objects.filter(post_count__gt=0).order_by("-post_count", "name")[:max(limit, 0)]
+		serializer = TagCountSerializer(instance=tags, many=True)
+		return Response(status=status.HTTP_200_OK, data=serializer.data)
@@ -0,0 +1,101 @@
+"""
+	buffered post visits counter.
+	visits are counted in memory of each process and written to the database
+	with one 'F("visits") + n' update per distinct n. a daemon thread started on
+	the first visit flushes every POST_VISITS_FLUSH_INTERVAL seconds, a visit
+	also flushes when the interval passed or POST_VISITS_FLUSH_SIZE posts are
+	pending and the process flushes at exit, so reading a post is not a write
+	anymore. buffered visits of this
+	process are added to the stored ones in PostSerializer.
+
+"""
+from collections import Counter, defaultdict
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from config.settings import POST_VISITS_FLUSH_INTERVAL, POST_VISITS_FLUSH_SIZE
+from .models import Post
+
+_lock = threading.Lock()
+_pending = Counter()
+_last_flush = time.monotonic()
+_flusher = None
+
+logger = logging.getLogger(__name__)
+
+
+def record_visit(post_id):
+	if _flusher is None and settings.POST_VISITS_FLUSH_THREAD:
+		start_flusher()
+	with _lock:
+		_pending[post_id] += 1
+		due = (
+			time.monotonic() - _last_flush >= POST_VISITS_FLUSH_INTERVAL
+			or len(_pending) >= POST_VISITS_FLUSH_SIZE)
+	if due:
+		flush_visits()
+
+
+def pending_visits(post_id):
+	with _lock:
+		return _pending.get(post_id, 0)
+
+
+def flush_visits():
+	global _last_flush
+	with _lock:
+		pending = dict(_pending)
+		_pending.clear()
+		_last_flush = time.monotonic()
+
+	# posts with the same number of new visits share one update query
+	posts_by_count = defaultdict(list)
+	for post_id, count in pending.items():
+		posts_by_count[count].append(post_id)
+	try:
+		for count, post_ids in posts_by_count.items():
+			Post.objects.filter(pk__in=post_ids).update(visits=F("visits") + count)
+			for post_id in post_ids:
+				del pending[post_id]
+	except Exception:
+		# keep what is not written yet for the next flush
+		with _lock:
+			_pending.update(pending)
+		raise
+
+
+def _flush_periodically():
+	while True:
+		time.sleep(POST_VISITS_FLUSH_INTERVAL)
+		try:
+			flush_visits()
+		except Exception:
+			logger.exception("buffered post visits not flushed")
+		finally:
+			# the thread got its own database connection
+			connection.close()
+
+
+def start_flusher():
+	""" start the flushing thread of this process, once. """
+	global _flusher
+	with _lock:
+		if _flusher is not None:
+			return
+		_flusher = threading.Thread(
+			target=_flush_periodically, name="post-visits-flush", daemon=True)
+		_flusher.start()
+
+
+@atexit.register
+def _flush_at_exit():
+	# a restart or redeploy should not lose the buffered visits
+	try:
+		flush_visits()
+	except Exception:
+		logger.exception("buffered post visits lost at exit")
@@ -0,0 +1,5 @@
+CONFIG_SECRET_KEY = "local-test-key"
+CONFIG_DEBUG = True
+EMAIL = "test@example.com"
+SMTP = "localhost"
+PASSWORD = ""
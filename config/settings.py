@@ -27,6 +27,7 @@ INSTALLED_APPS = [
     'corsheaders',
     'drf_yasg',
     'blog.apps.BlogConfig',
+    'search.apps.SearchConfig',
     'rest_framework.authtoken',
     'rest_framework_simplejwt.token_blacklist',
 ]
@@ -74,6 +75,16 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -129,7 +140,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'customauth.authentication.CachedJWTAuthentication',
     ],
 }
 # django-cors-headers configs
@@ -165,6 +176,30 @@ if not DEBUG:
     SESSION_COOKIE_SECURE = True
 
 MOVIE_PER_USER = 10
+# seconds a group unwatched movie pool stays cached (invalidated on change anyway)
+GROUP_MOVIES_CACHE_TIMEOUT = 60 * 60
+# seconds a user groups dashboard stays cached, also bounds how long a renamed
+# admin or movie owner username can be shown (group and movie changes invalidate it)
+USER_DASHBOARD_CACHE_TIMEOUT = 60 * 10
+# post visits are buffered in memory and written at most every this seconds
+POST_VISITS_FLUSH_INTERVAL = 30
+# or as soon as this number of posts have buffered visits
+POST_VISITS_FLUSH_SIZE = 500
+# a background thread flushes the visits every interval, False flushes only on
+# visits and at exit (tests)
+POST_VISITS_FLUSH_THREAD = True
+# full-text search backend, search.backends.SimpleSearchBackend for databases without FTS5
+SEARCH_BACKEND = "search.backends.SQLiteFTSBackend"
+# ranked matches considered per search before visibility filtering and pagination
+SEARCH_MAX_RESULTS = 500
+# seconds a mailed password reset code and its token are valid
+PASSWORD_RESET_CODE_TIMEOUT = 15 * 60
+# checks of a reset code before it stops working, right ones count too so a
+# confirm and a reset leave room for 3 wrong codes
+PASSWORD_RESET_MAX_ATTEMPTS = 5
+# seconds an authenticated user and its profile stay cached, saves invalidate it
+# in this process, other processes see the change after at most this long
+AUTH_USER_CACHE_TIMEOUT = 60
 
 CONTACT_US_SETTINGS = {
     "APP_NAME": "Film Review",
@@ -1,7 +1,13 @@
 from django.contrib import admin
-from .models import Contact
+from .models import Contact, QueuedEmail
 
 
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
 	list_display = ("name", "email", "text")
+
+
+@admin.register(QueuedEmail)
+class QueuedEmailAdmin(admin.ModelAdmin):
+	list_display = ("subject", "status", "attempts", "next_attempt", "sent")
+	list_filter = ("status", )
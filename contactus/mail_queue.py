@@ -0,0 +1,217 @@
+"""
+	local email outbox.
+	views call enqueue_email() which only insert a QueuedEmail row, so SMTP
+	latency and failures stay out of the request. the send_queued_emails command
+	calls drain_outbox() that claims the due emails, sends them from a thread pool
+	where every worker keeps one connection open for its whole share and writes
+	the results back in bulk. a failed email is retried with exponential backoff
+	until MAIL_QUEUE_MAX_ATTEMPTS, delivery is at least once.
+	MassEmail jobs are run by the same command with run_mass_emails(), their
+	recipients are streamed from the contacts and sent in bcc batches.
+
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+import uuid
+
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, F
+from django.utils import timezone
+from .models import Contact, MassEmail, QueuedEmail
+from . import settings_loader
+
+SETTINGS = settings_loader.DEFAULT_CONTACT_US_SETTINGS
+
+
+def claim_expiry():
+	return timezone.now() + timedelta(seconds=SETTINGS["MAIL_QUEUE_CLAIM_TIMEOUT"])
+
+
+def retry_delay(attempts):
+	# seconds before the next try after 'attempts' failed ones
+	return timedelta(seconds=SETTINGS["MAIL_QUEUE_RETRY_DELAY"] * 2 ** (attempts - 1))
+
+
+def enqueue_email(subject, text, to=(), bcc=()):
+	return QueuedEmail.objects.create(subject=subject, text=text, to=list(to), bcc=list(bcc))
+
+
+def claim_due_emails(batch_size):
+	"""
+		mark up to 'batch_size' due emails as 'sending' for this drain and return
+		them. emails of a drain that died become due again when their claim expire.
+
+	"""
+
+	now = timezone.now()
+	due = QueuedEmail.objects.filter(
+		status__in=(QueuedEmail.QUEUED, QueuedEmail.SENDING), next_attempt__lte=now)
+	ids = list(due.order_by("next_attempt").values_list("pk", flat=True)[:batch_size])
+	if not ids:
+		return []
+
+	# same conditions in the update, a row claimed meanwhile by another drain has
+	# a next_attempt in the future and is skipped
+	claim = uuid.uuid4().hex
+	due.filter(pk__in=ids).update(
+		status=QueuedEmail.SENDING, claim=claim, next_attempt=claim_expiry())
+	return list(QueuedEmail.objects.filter(claim=claim).order_by("pk"))
+
+
+def send_emails(emails):
+	""" send the emails over one connection, returns {pk: None if sent else error}. runs in the pool threads so it dont touch the database. """
+	connection = get_connection()
+	try:
+		connection.open()
+	except Exception as ex:
+		return {email.pk: repr(ex) for email in emails}
+
+	results = {}
+	try:
+		for email in emails:
+			message = EmailMessage(
+				email.subject, email.text, to=email.to, bcc=email.bcc,
+				connection=connection)
+			try:
+				message.send()
+			except Exception as ex:
+				results[email.pk] = repr(ex)
+			else:
+				results[email.pk] = None
+	finally:
+		connection.close()
+	return results
+
+
+def record_results(emails, results):
+	now = timezone.now()
+	counts = {"sent": 0, "retried": 0, "failed": 0}
+	for email in emails:
+		error = results[email.pk]
+		email.attempts += 1
+		email.claim = ""
+		if error is None:
+			email.status = QueuedEmail.SENT
+			email.sent = now
+			email.last_error = ""
+			counts["sent"] += 1
+		elif email.attempts >= SETTINGS["MAIL_QUEUE_MAX_ATTEMPTS"]:
+			email.status = QueuedEmail.FAILED
+			email.last_error = error
+			counts["failed"] += 1
+		else:
+			email.status = QueuedEmail.QUEUED
+			email.last_error = error
+			email.next_attempt = now + retry_delay(email.attempts)
+			counts["retried"] += 1
+	QueuedEmail.objects.bulk_update(
+		emails, ["status", "sent", "attempts", "claim", "last_error", "next_attempt"])
+	return counts
+
+
+def drain_outbox(workers=None, batch_size=None):
+	"""
+		send every due email of the outbox, 'batch_size' emails at a time split
+		between 'workers' threads. returns the number of emails "sent", "retried"
+		(back in the queue with a later next_attempt) and "failed" (out of attempts).
+
+	"""
+
+	workers = workers or SETTINGS["MAIL_QUEUE_WORKERS"]
+	batch_size = batch_size or SETTINGS["MAIL_QUEUE_BATCH_SIZE"]
+	counts = {"sent": 0, "retried": 0, "failed": 0}
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		while True:
+			emails = claim_due_emails(batch_size)
+			if not emails:
+				break
+			shares = [emails[index::workers] for index in range(min(workers, len(emails)))]
+			results = {}
+			for share_results in executor.map(send_emails, shares):
+				results.update(share_results)
+			for name, count in record_results(emails, results).items():
+				counts[name] += count
+	return counts
+
+
+def claim_mass_email():
+	""" claim the oldest due mass email job with a conditional update, None if there is none. """
+	due = MassEmail.objects.filter(
+		status__in=(QueuedEmail.QUEUED, QueuedEmail.SENDING),
+		next_attempt__lte=timezone.now())
+	for pk in due.order_by("pk").values_list("pk", flat=True)[:5]:
+		if due.filter(pk=pk).update(status=QueuedEmail.SENDING, next_attempt=claim_expiry()):
+			return MassEmail.objects.get(pk=pk)
+	return None
+
+
+def batches(iterable, size):
+	iterator = iter(iterable)
+	batch = list(islice(iterator, size))
+	while batch:
+		yield batch
+		batch = list(islice(iterator, size))
+
+
+def send_mass_email(mass_email, batch_size=None):
+	"""
+		send a claimed mass email to every distinct contact email after its
+		'last_recipient', 'batch_size' addresses in bcc per message over one
+		connection. progress is written after every batch, which also extends the
+		claim, so a crashed job is resumed from the last sent batch by the next
+		drain. returns True when the job is finished.
+
+	"""
+
+	batch_size = batch_size or SETTINGS["MASS_EMAIL_BATCH_SIZE"]
+	jobs = MassEmail.objects.filter(pk=mass_email.pk)
+	recipients = Contact.objects.order_by("email").values_list("email", flat=True).distinct()
+	if not mass_email.last_recipient:
+		jobs.update(recipients_total=recipients.exclude(email="").count())
+
+	connection = get_connection()
+	try:
+		connection.open()
+		# emails are compared as strings so "" as cursor also skips empty ones
+		pending = recipients.filter(email__gt=mass_email.last_recipient).iterator()
+		for batch in batches(pending, batch_size):
+			EmailMessage(
+				mass_email.subject, mass_email.text, bcc=batch,
+				connection=connection).send()
+			jobs.update(
+				last_recipient=batch[-1], recipients_sent=F("recipients_sent") + len(batch),
+				batches_sent=F("batches_sent") + 1, next_attempt=claim_expiry())
+	except Exception as ex:
+		attempts = mass_email.attempts + 1
+		if attempts >= SETTINGS["MAIL_QUEUE_MAX_ATTEMPTS"]:
+			jobs.update(status=QueuedEmail.FAILED, attempts=attempts, last_error=repr(ex))
+		else:
+			jobs.update(
+				status=QueuedEmail.QUEUED, attempts=attempts, last_error=repr(ex),
+				next_attempt=timezone.now() + retry_delay(attempts))
+		return False
+	finally:
+		connection.close()
+
+	jobs.update(status=QueuedEmail.SENT, finished=timezone.now(), last_error="")
+	return True
+
+
+def run_mass_emails(batch_size=None):
+	""" run every due mass email job, returns the number of finished ones. """
+	finished = 0
+	mass_email = claim_mass_email()
+	while mass_email is not None:
+		finished += send_mass_email(mass_email, batch_size)
+		mass_email = claim_mass_email()
+	return finished
+
+
+def outbox_status():
+	""" number of emails in every status, one query. """
+	counts = dict.fromkeys((status for status, _ in QueuedEmail.STATUS_CHOICES), 0)
+	counts.update(
+		QueuedEmail.objects.order_by().values_list("status").annotate(
+			count=Count("pk")))
+	return counts
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from contactus.mail_queue import drain_outbox, run_mass_emails
+from customauth.password_reset import process_reset_requests
+
+
+class Command(BaseCommand):
+	help = (
+		"queue the codes of pending password resets, send the due emails of the "
+		"outbox and run the due mass email jobs once, or every --interval seconds "
+		"until stopped.")
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--workers", type=int, default=None,
+			help="sending threads, each with its own connection (default MAIL_QUEUE_WORKERS).")
+		parser.add_argument(
+			"--batch-size", type=int, default=None,
+			help="emails claimed at a time (default MAIL_QUEUE_BATCH_SIZE).")
+		parser.add_argument(
+			"--mass-batch-size", type=int, default=None,
+			help="bcc addresses per mass email message (default MASS_EMAIL_BATCH_SIZE).")
+		parser.add_argument(
+			"--interval", type=float, default=0,
+			help="keep running and drain the outbox every this seconds, 0 drains once.")
+
+	def handle(self, *args, **options):
+		while True:
+			# reset codes first so they go out in this drain
+			resets = process_reset_requests()
+			counts = drain_outbox(options["workers"], options["batch_size"])
+			counts["resets"] = resets
+			counts["mass"] = run_mass_emails(options["mass_batch_size"])
+			if any(counts.values()) or not options["interval"]:
+				self.stdout.write(
+					"{resets} reset codes queued, {sent} sent, {retried} to retry, {failed} failed, "
+					"{mass} mass emails finished.".format(**counts))
+			if not options["interval"]:
+				break
+			time.sleep(options["interval"])
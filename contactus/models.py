@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from .utils import random_key
 
 
@@ -10,7 +11,8 @@ class ReadedManager(models.Manager):
 class Contact(models.Model):
 	key = models.CharField(default=random_key, unique=True, max_length=13)
 	name = models.CharField(max_length=30)
-	email = models.EmailField()
+	# indexed for the distinct, email ordered recipients of mass emails
+	email = models.EmailField(db_index=True)
 	subject = models.CharField(max_length=30, blank=True, null=True)
 	text = models.TextField()
 	phone_number = models.CharField(max_length=13, blank=True, null=True)
@@ -26,12 +28,60 @@ class Contact(models.Model):
 		return self.name
 
 
+class QueuedEmail(models.Model):
+	""" an email waiting in the outbox, sent by the send_queued_emails command (see contactus.mail_queue). """
+	QUEUED = "queued"
+	SENDING = "sending"
+	SENT = "sent"
+	FAILED = "failed"
+	STATUS_CHOICES = (
+		(QUEUED, 'Queued'),
+		(SENDING, 'Sending'),
+		(SENT, 'Sent'),
+		(FAILED, 'Failed'),
+	)
+	subject = models.CharField(max_length=200)
+	text = models.TextField()
+	to = models.JSONField(default=list)
+	bcc = models.JSONField(default=list)
+	status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=QUEUED)
+	# when the email can be tried (again), for 'sending' when its claim expires
+	next_attempt = models.DateTimeField(default=timezone.now)
+	attempts = models.PositiveSmallIntegerField(default=0)
+	# random token of the drain that claimed it
+	claim = models.CharField(max_length=32, blank=True, db_index=True)
+	last_error = models.TextField(blank=True)
+	created = models.DateTimeField(auto_now_add=True)
+	sent = models.DateTimeField(blank=True, null=True)
+
+	class Meta:
+		indexes = [
+			# drains pick due emails in order
+			models.Index(fields=["status", "next_attempt"], name="email_status_next_idx"),
+		]
+
+	def __str__(self):
+		return self.subject
+
+
 class MassEmail(models.Model):
+	""" a mass email job, sent to every distinct contact email in batches by the send_queued_emails command. """
 	key = models.CharField(default=random_key, max_length=13, unique=True)
 	datetime = models.DateTimeField(auto_now=True)
 	admin_name = models.CharField(max_length=30, blank=True, null=True)
 	subject = models.CharField(max_length=50)
 	text = models.TextField()
+	status = models.CharField(
+		max_length=7, choices=QueuedEmail.STATUS_CHOICES, default=QueuedEmail.QUEUED)
+	next_attempt = models.DateTimeField(default=timezone.now)
+	attempts = models.PositiveSmallIntegerField(default=0)
+	last_error = models.TextField(blank=True)
+	# progress, recipients are sent in email order so the last one is the resume cursor
+	recipients_total = models.PositiveIntegerField(default=0)
+	recipients_sent = models.PositiveIntegerField(default=0)
+	batches_sent = models.PositiveIntegerField(default=0)
+	last_recipient = models.EmailField(blank=True)
+	finished = models.DateTimeField(blank=True, null=True)
 
 	def __str__(self):
-		return self.name
\ No newline at end of file
+		return self.subject
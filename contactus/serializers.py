@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Contact
+from .models import Contact, MassEmail, QueuedEmail
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -8,3 +8,20 @@ class ContactSerializer(serializers.ModelSerializer):
 		fields = (
 			"key", "name", "email", "subject", "text", "phone_number", "address",
 			"datetime", "ip", "is_readed")
+
+
+class QueuedEmailSerializer(serializers.ModelSerializer):
+	class Meta:
+		model = QueuedEmail
+		fields = (
+			"id", "subject", "status", "attempts", "next_attempt", "last_error",
+			"created", "sent")
+
+
+class MassEmailSerializer(serializers.ModelSerializer):
+	class Meta:
+		model = MassEmail
+		fields = (
+			"key", "subject", "status", "recipients_total", "recipients_sent",
+			"batches_sent", "attempts", "next_attempt", "last_error", "datetime",
+			"finished")
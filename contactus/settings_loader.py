@@ -3,7 +3,17 @@ DEFAULT_CONTACT_US_SETTINGS = {
 	'APP_NAME': None,
 	'SEND_MAIL': False,
 	'MAIL_SUBJECT': " Contact Us ",
-	'MESSAGE': "\nwe got your email. we will respond as soon as possible.\n\nBest Regards, "
+	'MESSAGE': "\nwe got your email. we will respond as soon as possible.\n\nBest Regards, ",
+	# outbox drained by the send_queued_emails command
+	'MAIL_QUEUE_WORKERS': 4,
+	'MAIL_QUEUE_BATCH_SIZE': 100,
+	'MAIL_QUEUE_MAX_ATTEMPTS': 5,
+	# seconds before the first retry, doubled on every failed attempt
+	'MAIL_QUEUE_RETRY_DELAY': 60,
+	# seconds a claimed email can stay 'sending' before another drain takes it
+	'MAIL_QUEUE_CLAIM_TIMEOUT': 10 * 60,
+	# bcc addresses per message of a mass email, keep under the SMTP server recipients limit
+	'MASS_EMAIL_BATCH_SIZE': 50,
 }
 
 try:
@@ -11,7 +21,10 @@ try:
 except ImportError:
 	print("add CONTACT_US_SETTINGS to projects settings.py")
 	exit()
-fields = ["APP_NAME", "SEND_MAIL", "MAIL_SUBJECT", "MESSAGE"]
+fields = [
+	"APP_NAME", "SEND_MAIL", "MAIL_SUBJECT", "MESSAGE", "MAIL_QUEUE_WORKERS",
+	"MAIL_QUEUE_BATCH_SIZE", "MAIL_QUEUE_MAX_ATTEMPTS", "MAIL_QUEUE_RETRY_DELAY",
+	"MAIL_QUEUE_CLAIM_TIMEOUT", "MASS_EMAIL_BATCH_SIZE"]
 
 for field in fields:
 	if field in settings.CONTACT_US_SETTINGS:
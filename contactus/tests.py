@@ -0,0 +1,137 @@
+from smtplib import SMTPException
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TestCase, override_settings
+from api.benchmark import BudgetTestCase
+from contactus.mail_queue import drain_outbox, enqueue_email, run_mass_emails
+from contactus.models import Contact, MassEmail, QueuedEmail
+
+
+class FailingEmailBackend(BaseEmailBackend):
+	def send_messages(self, email_messages):
+		raise SMTPException("connection refused")
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+	""" fail once after 'fail_after' messages, like a dropped connection in the middle of a mass email. """
+	fail_after = None
+
+	def send_messages(self, email_messages):
+		if FlakyEmailBackend.fail_after is not None and len(mail.outbox) >= FlakyEmailBackend.fail_after:
+			FlakyEmailBackend.fail_after = None
+			raise SMTPException("connection dropped")
+		return super(FlakyEmailBackend, self).send_messages(email_messages)
+
+
+class ContactusEndpointBudgetTests(BudgetTestCase):
+	""" query-count and wall-time budgets of contactus/urls.py endpoints. """
+
+	def setUp(self):
+		super(ContactusEndpointBudgetTests, self).setUp()
+		self.authenticate(User.objects.get(username="admin"))
+
+	def test_create_form(self):
+		self.client.credentials()
+		self.assertWithinBudget(
+			"contactus:contact-create", "post", "/v1/contact/", queries=4, status=200,
+			data={"name": "name", "email": "name@example.com", "text": "text"})
+		# queued, not sent inside the request
+		self.assertEqual(len(mail.outbox), 0)
+		self.assertEqual(QueuedEmail.objects.get().to, ["name@example.com"])
+
+	def test_admin_contact_reader(self):
+		self.assertWithinBudget(
+			"contactus:contact-list", "get", "/v1/admin/contact/", queries=2, status=200)
+
+	def test_admin_contact_reader_by_month(self):
+		self.assertWithinBudget(
+			"contactus:contact-list-month", "get", "/v1/admin/contact/2021/1/",
+			queries=2, status=200)
+
+	def test_admin_send_mass_email(self):
+		response = self.assertWithinBudget(
+			"contactus:mass-mail", "post", "/v1/admin/mass_mail/", queries=2, status=200,
+			data={"subject": "subject", "text": "text", "name": "admin"})
+		# a job for the worker, no recipient is read in the request
+		self.assertEqual(len(mail.outbox), 0)
+		self.assertEqual(MassEmail.objects.get(key=response.data["key"]).status, QueuedEmail.QUEUED)
+
+	def test_admin_mass_email_status(self):
+		email = MassEmail.objects.create(subject="subject", text="text")
+		response = self.assertWithinBudget(
+			"contactus:mass-mail-status", "get", "/v1/admin/mass_mail/{0}/".format(email.key),
+			queries=2, status=200)
+		self.assertEqual(response.data["status"], QueuedEmail.QUEUED)
+
+	def test_admin_mail_queue_status(self):
+		enqueue_email("subject", "text", to=["to@example.com"])
+		response = self.assertWithinBudget(
+			"contactus:mail-queue", "get", "/v1/admin/mail_queue/", queries=3, status=200)
+		self.assertEqual(response.data["counts"]["queued"], 1)
+
+
+class MailQueueTests(TestCase):
+	""" draining the outbox with the locmem backend. """
+
+	def test_drain_outbox(self):
+		for index in range(10):
+			enqueue_email("subject {0}".format(index), "text", to=["to{0}@example.com".format(index)])
+		self.assertEqual(drain_outbox(workers=3, batch_size=4), {"sent": 10, "retried": 0, "failed": 0})
+		self.assertEqual(len(mail.outbox), 10)
+		self.assertEqual(QueuedEmail.objects.filter(status=QueuedEmail.SENT).count(), 10)
+		# nothing left to send
+		self.assertEqual(drain_outbox(), {"sent": 0, "retried": 0, "failed": 0})
+
+	@override_settings(EMAIL_BACKEND="contactus.tests.FailingEmailBackend")
+	def test_retry_with_backoff(self):
+		email = enqueue_email("subject", "text", to=["to@example.com"])
+		self.assertEqual(drain_outbox(), {"sent": 0, "retried": 1, "failed": 0})
+		email.refresh_from_db()
+		self.assertEqual(email.status, QueuedEmail.QUEUED)
+		self.assertEqual(email.attempts, 1)
+		self.assertIn("connection refused", email.last_error)
+		# not due before the backoff delay
+		self.assertEqual(drain_outbox(), {"sent": 0, "retried": 0, "failed": 0})
+
+		QueuedEmail.objects.filter(pk=email.pk).update(attempts=4, next_attempt=email.created)
+		self.assertEqual(drain_outbox(), {"sent": 0, "retried": 0, "failed": 1})
+		email.refresh_from_db()
+		self.assertEqual(email.status, QueuedEmail.FAILED)
+
+
+class MassEmailTests(TestCase):
+	""" mass email jobs with the locmem backend. """
+
+	def setUp(self):
+		Contact.objects.bulk_create([
+			Contact(key=str(index), name="contact", email="contact{0}@example.com".format(index % 7), text="text")
+			for index in range(10)])
+
+	def test_batches_of_distinct_recipients(self):
+		email = MassEmail.objects.create(subject="subject", text="text")
+		self.assertEqual(run_mass_emails(batch_size=3), 1)
+		# 7 distinct addresses in bcc, never in 'to'
+		self.assertEqual([len(message.bcc) for message in mail.outbox], [3, 3, 1])
+		self.assertEqual(sum((message.to for message in mail.outbox), []), [])
+		email.refresh_from_db()
+		self.assertEqual(email.status, QueuedEmail.SENT)
+		self.assertEqual((email.recipients_total, email.recipients_sent, email.batches_sent), (7, 7, 3))
+
+	@override_settings(EMAIL_BACKEND="contactus.tests.FlakyEmailBackend")
+	def test_resume_after_failure(self):
+		FlakyEmailBackend.fail_after = 2
+		email = MassEmail.objects.create(subject="subject", text="text")
+		self.assertEqual(run_mass_emails(batch_size=2), 0)
+		email.refresh_from_db()
+		self.assertEqual((email.status, email.recipients_sent, email.attempts), (QueuedEmail.QUEUED, 4, 1))
+
+		MassEmail.objects.filter(pk=email.pk).update(next_attempt=email.datetime)
+		self.assertEqual(run_mass_emails(batch_size=2), 1)
+		# every address exactly once across both runs
+		recipients = sum((message.bcc for message in mail.outbox), [])
+		self.assertEqual(sorted(recipients), ["contact{0}@example.com".format(index) for index in range(7)])
+		email.refresh_from_db()
+		self.assertEqual((email.status, email.recipients_sent), (QueuedEmail.SENT, 7))
@@ -1,5 +1,7 @@
 from django.urls import path
-from .views import CreateForm, AdminContactReader, AdminSendMassEmail
+from .views import (
+	CreateForm, AdminContactReader, AdminSendMassEmail, AdminMailQueueStatus,
+	AdminMassEmailStatus)
 
 app_name = "contact"
 
@@ -8,4 +10,6 @@ urlpatterns = [
 	path("admin/contact/", AdminContactReader.as_view()),
 	path("admin/contact/<int:year>/<int:month>/", AdminContactReader.as_view()),
 	path("admin/mass_mail/", AdminSendMassEmail.as_view()),
+	path("admin/mass_mail/<str:key>/", AdminMassEmailStatus.as_view()),
+	path("admin/mail_queue/", AdminMailQueueStatus.as_view()),
 ]
@@ -1,12 +1,12 @@
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.core.mail import EmailMessage
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
-from .models import Contact, MassEmail
+from .models import Contact, MassEmail, QueuedEmail
 from .utils import get_client_ip
-from .serializers import ContactSerializer
+from .serializers import ContactSerializer, QueuedEmailSerializer, MassEmailSerializer
+from .mail_queue import enqueue_email, outbox_status
 from . import settings_loader
 
 
@@ -41,7 +41,8 @@ class CreateForm(APIView):
 			mail_subject = settings_loader.DEFAULT_CONTACT_US_SETTINGS["APP_NAME"] + settings_loader.DEFAULT_CONTACT_US_SETTINGS["MAIL_SUBJECT"]
 			message = "dear, " + contact.name + settings_loader.DEFAULT_CONTACT_US_SETTINGS["MESSAGE"] + admin_name
 			to_email = contact.email
-			EmailMessage(mail_subject, message, to=[to_email]).send()
+			# sent by the send_queued_emails command, not inside the request
+			enqueue_email(mail_subject, message, to=[to_email])
 
 		return Response(status=status.HTTP_200_OK, data={"detail": "form created."})
 
@@ -78,17 +79,37 @@ class AdminSendMassEmail(APIView):
 	def post(self, request, format=None):
 		fields = ["subject", "text"]
 		for field in fields:
-			if field not in request:
+			if field not in request.data:
 				return Response(
 					status=status.HTTP_400_BAD_REQUEST,
 					data={"detail": "field '{0}' not provided.".format(field)})
 
-		email = MassEmail.objects.create(subject=request.data["subject"], text=request.data["text"])
-		if "name" in request.data:
-			email.name = request.data["name"]
-		email.save()
-		mail_subject = request.data["subject"]
-		message = request.data["text"]
-		all_emails = list(Contact.objects.all().values_list("email", flat=True))
-		EmailMessage(mail_subject, message, to=all_emails).send()
-		return Response(status=status.HTTP_200_OK, data={"detail": "mass email sent.", "emails": all_emails})
+		# a job for the send_queued_emails command, recipients are read and sent in batches there
+		email = MassEmail.objects.create(
+			subject=request.data["subject"], text=request.data["text"],
+			admin_name=request.data.get("name"))
+		return Response(
+			status=status.HTTP_200_OK,
+			data={"detail": "mass email queued.", "key": email.key})
+
+
+class AdminMassEmailStatus(APIView):
+	""" status and progress of a mass email job. """
+	permission_classes = (permissions.IsAdminUser, )
+
+	def get(self, request, key, format=None):
+		email = get_object_or_404(MassEmail, key=key)
+		serializer = MassEmailSerializer(instance=email)
+		return Response(status=status.HTTP_200_OK, data=serializer.data)
+
+
+class AdminMailQueueStatus(APIView):
+	""" number of outbox emails in every status and the latest failed ones with their error. """
+	permission_classes = (permissions.IsAdminUser, )
+
+	def get(self, request, format=None):
+		failed = QueuedEmail.objects.filter(status=QueuedEmail.FAILED).order_by("-pk")[:20]
+		serializer = QueuedEmailSerializer(instance=failed, many=True)
+		return Response(
+			status=status.HTTP_200_OK,
+			data={"counts": outbox_status(), "failed": serializer.data})
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CustomauthConfig(AppConfig):
     name = 'customauth'
+
+    def ready(self):
+        from . import signals  # noqa: F401
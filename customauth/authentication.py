@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from config.settings import AUTH_USER_CACHE_TIMEOUT
+
+
+def auth_user_cache_key(user_id):
+	return "auth_user:{0}".format(user_id)
+
+
+def invalidate_auth_user(*user_ids):
+	cache.delete_many([auth_user_cache_key(user_id) for user_id in user_ids])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+	"""
+		JWTAuthentication that loads the user with its profile in one query and
+		caches the pair per user id for AUTH_USER_CACHE_TIMEOUT seconds, so most
+		requests authenticate and read request.user.profile without a query.
+		saving or deleting a user or profile drops the entry (customauth.signals),
+		queryset updates dont, so only read identity and permission fields from it.
+
+	"""
+
+	def get_user(self, validated_token):
+		try:
+			user_id = validated_token[api_settings.USER_ID_CLAIM]
+		except KeyError:
+			raise InvalidToken(_('Token contained no recognizable user identification'))
+
+		cache_key = auth_user_cache_key(user_id)
+		user = cache.get(cache_key)
+		if user is None:
+			user = User.objects.select_related("profile").filter(
+				**{api_settings.USER_ID_FIELD: user_id}).first()
+			if user is None:
+				raise AuthenticationFailed(_('User not found'), code='user_not_found')
+			cache.set(cache_key, user, AUTH_USER_CACHE_TIMEOUT)
+
+		if not user.is_active:
+			raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+		return user
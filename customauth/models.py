@@ -14,6 +14,40 @@ class Profile(models.Model):
 	image = models.ImageField(
 		upload_to=profile_image, default="profile/default/default.png")
 	group = models.ManyToManyField(Group, blank=True)
+	# number of user movies, reserved atomically against MOVIE_PER_USER on create
+	movie_count = models.PositiveIntegerField(default=0)
+
+	def __str__(self):
+		return self.user.username
+
+
+class PasswordResetRequest(models.Model):
+	"""
+		a forgot password request waiting for the send_queued_emails worker, which
+		looks the email up and mails a code for 'nonce' (see customauth.password_reset).
+	"""
+	email = models.EmailField()
+	nonce = models.CharField(max_length=32, unique=True)
+	created = models.DateTimeField(auto_now_add=True)
+
+	def __str__(self):
+		return self.email
+
+
+class PasswordResetCode(models.Model):
+	"""
+		a mailed password reset code, only its hmac is stored. the client holds a
+		signed token of 'nonce' so the flow needs no session (see customauth.password_reset).
+	"""
+	user = models.ForeignKey(
+		User, on_delete=models.CASCADE, related_name='password_reset_codes')
+
+	nonce = models.CharField(max_length=32, unique=True)
+	code_hash = models.CharField(max_length=64)
+	expires = models.DateTimeField()
+	attempts = models.PositiveSmallIntegerField(default=0)
+	used = models.BooleanField(default=False)
+	created = models.DateTimeField(auto_now_add=True)
 
 	def __str__(self):
 		return self.user.username
@@ -0,0 +1,124 @@
+"""
+	stateless password reset.
+	ForgotPasswordView answers every valid email with a token, a signed random
+	nonce, and only inserts a PasswordResetRequest row, the same work for known
+	and unknown emails so the response time tells nothing about the email. the
+	send_queued_emails worker calls process_reset_requests() that looks the
+	emails up, stores a PasswordResetCode (only the hmac of the code) and queues
+	the mail. requests are rows so nothing piles up in the web processes or is
+	lost on restart. confirm and reset send the token and the code back and are
+	checked with indexed lookups of the nonce, no session is used. a code
+	expires after PASSWORD_RESET_CODE_TIMEOUT seconds, is used once and is
+	burned after PASSWORD_RESET_MAX_ATTEMPTS checks. used and expired codes are
+	deleted when a new code is created.
+
+"""
+from datetime import timedelta
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, get_random_string, salted_hmac
+from contactus.mail_queue import enqueue_email
+from .models import PasswordResetCode, PasswordResetRequest
+
+SALT = "customauth.password_reset"
+
+
+def request_password_reset(email):
+	""" queue a reset for 'email' and return the token for the client, one insert for any email. """
+	nonce = uuid.uuid4().hex
+	PasswordResetRequest.objects.create(email=email, nonce=nonce)
+	return signing.TimestampSigner(salt=SALT).sign(nonce)
+
+
+def hash_code(nonce, code):
+	return salted_hmac(SALT, "{0}:{1}".format(nonce, code)).hexdigest()
+
+
+def send_password_reset_code(user, nonce):
+	code = get_random_string(6, "0123456789")
+	# a new code replaces the previous ones of the user, used and expired codes
+	# of everyone are purged on the way
+	PasswordResetCode.objects.filter(
+		Q(user=user) | Q(used=True) | Q(expires__lte=timezone.now())).delete()
+	PasswordResetCode.objects.create(
+		user=user, nonce=nonce, code_hash=hash_code(nonce, code),
+		expires=timezone.now() + timedelta(seconds=settings.PASSWORD_RESET_CODE_TIMEOUT))
+	name = "user"
+	if not user.first_name == "":
+		name = user.first_name
+	message = 'Hi {0},\nthis is your password reset code:\n{1}'.format(name, code)
+	enqueue_email('Reset Your Password', message, to=[user.email])
+
+
+def process_reset_requests(batch_size=100):
+	"""
+		mail a code for every pending PasswordResetRequest of a known email, the
+		users of a batch are looked up in one query. requests older than
+		PASSWORD_RESET_CODE_TIMEOUT are dropped, their token expired anyway.
+		returns the number of codes queued.
+
+	"""
+
+	expired = timezone.now() - timedelta(seconds=settings.PASSWORD_RESET_CODE_TIMEOUT)
+	PasswordResetRequest.objects.filter(created__lte=expired).delete()
+	queued = 0
+	while True:
+		reset_requests = list(PasswordResetRequest.objects.order_by("pk")[:batch_size])
+		if not reset_requests:
+			break
+		# the oldest account of an email gets the code
+		users = {}
+		for user in User.objects.filter(
+				email__in={reset_request.email for reset_request in reset_requests}).order_by("-pk"):
+			users[user.email] = user
+		for reset_request in reset_requests:
+			with transaction.atomic():
+				# deleting is the claim, a parallel worker skips the request and a
+				# failure rolls the request back for the next run
+				if not PasswordResetRequest.objects.filter(pk=reset_request.pk).delete()[0]:
+					continue
+				# nothing happens for an unknown email, the requester can not tell
+				user = users.get(reset_request.email)
+				if user is not None:
+					send_password_reset_code(user, reset_request.nonce)
+					queued += 1
+	return queued
+
+
+def check_reset_code(token, code):
+	"""
+		the valid PasswordResetCode of 'token' and 'code' with its user and profile,
+		None if the token is forged or expired, the code is wrong, used or out of
+		attempts. every check takes an attempt with a conditional update before the
+		code is compared, so parallel guesses can not go over
+		PASSWORD_RESET_MAX_ATTEMPTS. confirm and reset are two checks of a right code.
+
+	"""
+
+	try:
+		nonce = signing.TimestampSigner(salt=SALT).unsign(
+			str(token), max_age=settings.PASSWORD_RESET_CODE_TIMEOUT)
+	except signing.BadSignature:
+		return None
+
+	reset_codes = PasswordResetCode.objects.filter(
+		nonce=nonce, used=False, expires__gt=timezone.now())
+	taken = reset_codes.filter(
+		attempts__lt=settings.PASSWORD_RESET_MAX_ATTEMPTS).update(attempts=F("attempts") + 1)
+	if taken != 1:
+		return None
+	reset_code = reset_codes.select_related("user__profile").first()
+	if reset_code is None or not constant_time_compare(hash_code(nonce, code), reset_code.code_hash):
+		return None
+	return reset_code
+
+
+def use_reset_code(reset_code):
+	# conditional update so two parallel resets can not both use the code
+	return PasswordResetCode.objects.filter(pk=reset_code.pk, used=False).update(used=True) == 1
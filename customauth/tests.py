@@ -1,3 +1,227 @@
-from django.test import TestCase
+from datetime import timedelta
+import io
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.benchmark import BudgetTestCase, PASSWORD
+from contactus.models import QueuedEmail
+from customauth.models import PasswordResetCode, PasswordResetRequest
+from customauth.password_reset import process_reset_requests
+
+MEDIA_ROOT = tempfile.mkdtemp()
+# password hashing is slow on purpose, give it room
+HASHING_TIME_BUDGET = 2
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CustomauthEndpointBudgetTests(BudgetTestCase):
+	""" query-count and wall-time budgets of customauth/urls.py endpoints. """
+
+	@classmethod
+	def tearDownClass(cls):
+		super(CustomauthEndpointBudgetTests, cls).tearDownClass()
+		shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+	def setUp(self):
+		super(CustomauthEndpointBudgetTests, self).setUp()
+		self.member = self.data["member"]
+		self.key = self.member.profile.key
+		self.authenticate(self.member)
+
+	def test_register(self):
+		self.client.credentials()
+		self.assertWithinBudget(
+			"customauth:register", "post", "/v1/auth/register/", queries=6, status=201,
+			seconds=HASHING_TIME_BUDGET, data={
+				"username": "new_user", "email": "new_user@example.com",
+				"password1": PASSWORD, "password2": PASSWORD})
+
+	def test_login(self):
+		self.client.credentials()
+		self.assertWithinBudget(
+			"customauth:login", "post", "/v1/auth/login/", queries=3, status=200,
+			seconds=HASHING_TIME_BUDGET,
+			data={"username": self.member.username, "password": PASSWORD})
+
+	def test_login_refresh(self):
+		self.client.credentials()
+		self.assertWithinBudget(
+			"customauth:login-refresh", "post", "/v1/auth/login/refresh/", queries=6,
+			status=200, data={"refresh": str(RefreshToken.for_user(self.member))})
+
+	def test_get_user_profile(self):
+		self.assertWithinBudget(
+			"customauth:profile", "get", "/v1/auth/dashboard/profile/", queries=1,
+			status=200)
+
+	def test_cached_authentication(self):
+		self.client.get("/v1/auth/dashboard/profile/")
+		# user and profile come from the cache
+		self.assertWithinBudget(
+			"customauth:profile-cached", "get", "/v1/auth/dashboard/profile/", queries=0,
+			status=200)
+		# a saved user is loaded again, an inactive one is rejected
+		self.member.is_active = False
+		self.member.save()
+		response = self.client.get("/v1/auth/dashboard/profile/")
+		self.assertEqual(response.status_code, 401)
+
+	def test_change_password(self):
+		self.assertWithinBudget(
+			"customauth:change-password", "put",
+			"/v1/auth/dashboard/change_password/{0}/".format(self.key), queries=3,
+			status=200, seconds=HASHING_TIME_BUDGET, data={
+				"old_password": PASSWORD, "password1": "new-" + PASSWORD,
+				"password2": "new-" + PASSWORD})
+
+	def test_update_profile(self):
+		self.assertWithinBudget(
+			"customauth:update-profile", "put",
+			"/v1/auth/dashboard/update_profile/{0}/".format(self.key), queries=6,
+			status=200, data={"first_name": "new name", "email": "new@example.com"})
+
+	def test_update_profile_skips_cached_user(self):
+		self.client.get("/v1/auth/dashboard/profile/")
+		# changed by another process, the cached user still has the old name
+		User.objects.filter(pk=self.member.pk).update(first_name="changed")
+		response = self.client.put(
+			"/v1/auth/dashboard/update_profile/{0}/".format(self.key),
+			data={"first_name": self.member.first_name})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(User.objects.get(pk=self.member.pk).first_name, self.member.first_name)
+
+	def test_change_image(self):
+		image = io.BytesIO()
+		Image.new("RGB", (10, 10)).save(image, "png")
+		image.name = "image.png"
+		image.seek(0)
+		self.assertWithinBudget(
+			"customauth:change-image", "put",
+			"/v1/auth/dashboard/change_image/{0}/".format(self.key), queries=3,
+			status=200, data={"image": image}, format="multipart")
+
+	def test_logout(self):
+		self.assertWithinBudget(
+			"customauth:logout", "post", "/v1/auth/dashboard/logout/", queries=7,
+			status=205, data={"refresh_token": str(RefreshToken.for_user(self.member))})
+
+	def test_delete_profile(self):
+		self.assertWithinBudget(
+			"customauth:delete-profile", "delete",
+			"/v1/auth/dashboard/delete_profile/{0}/".format(self.key), queries=3,
+			status=200, seconds=HASHING_TIME_BUDGET, data={"password": PASSWORD})
+
+	def test_password_checks_skip_cached_user(self):
+		self.client.get("/v1/auth/dashboard/profile/")
+		# changed by another process, the cached user still has the old password
+		User.objects.filter(pk=self.member.pk).update(
+			password=make_password("new-" + PASSWORD), username="renamed")
+		response = self.client.put(
+			"/v1/auth/dashboard/change_password/{0}/".format(self.key), data={
+				"old_password": PASSWORD, "password1": "other-" + PASSWORD,
+				"password2": "other-" + PASSWORD})
+		self.assertEqual(response.status_code, 403)
+		response = self.client.delete(
+			"/v1/auth/dashboard/delete_profile/{0}/".format(self.key),
+			data={"password": PASSWORD})
+		self.assertEqual(response.status_code, 403)
+		response = self.client.delete(
+			"/v1/auth/dashboard/delete_profile/{0}/".format(self.key),
+			data={"password": "new-" + PASSWORD})
+		self.assertEqual(response.status_code, 200)
+		user = User.objects.get(pk=self.member.pk)
+		self.assertFalse(user.is_active)
+		self.assertEqual(user.username, "renamed")
+		self.assertTrue(user.check_password("new-" + PASSWORD))
+
+	def test_forgot_password(self):
+		self.client.credentials()
+		self.assertWithinBudget(
+			"customauth:forgot-password", "post", "/v1/auth/forgot_password/",
+			queries=1, status=200, data={"email": self.member.email})
+		# the worker looks the email up and queues the code
+		self.assertFalse(QueuedEmail.objects.exists())
+		self.assertEqual(process_reset_requests(), 1)
+		self.assertEqual(QueuedEmail.objects.get().to, [self.member.email])
+		self.assertFalse(PasswordResetRequest.objects.exists())
+
+	def test_forgot_password_sent_by_worker(self):
+		self.client.credentials()
+		self.client.post("/v1/auth/forgot_password/", data={"email": self.member.email})
+		call_command("send_queued_emails", stdout=io.StringIO())
+		self.assertEqual([message.to for message in mail.outbox], [[self.member.email]])
+
+	def test_forgot_password_unknown_email(self):
+		# same status and queries for an address that has no account
+		self.client.credentials()
+		self.assertWithinBudget(
+			"customauth:forgot-password-unknown", "post", "/v1/auth/forgot_password/",
+			queries=1, status=200, data={"email": "nobody@example.com"})
+		self.assertEqual(process_reset_requests(), 0)
+		self.assertFalse(QueuedEmail.objects.exists())
+		self.assertFalse(PasswordResetRequest.objects.exists())
+
+	def test_reset_codes_purged(self):
+		self.client.credentials()
+		other = self.data["author"]
+		expired = timezone.now() - timedelta(seconds=1)
+		PasswordResetCode.objects.create(
+			user=other, nonce="used", code_hash="", expires=timezone.now(), used=True)
+		PasswordResetCode.objects.create(
+			user=other, nonce="expired", code_hash="", expires=expired)
+		self.forgot_password()
+		token, code = self.forgot_password()
+		# only the last code of the member is left
+		self.assertEqual(
+			list(PasswordResetCode.objects.values_list("user_id", flat=True)), [self.member.pk])
+		response = self.client.post("/v1/auth/confirm/", data={"token": token, "code": code})
+		self.assertEqual(response.status_code, 200)
+
+	def forgot_password(self):
+		# token from the response and the code from the queued mail
+		token = self.client.post(
+			"/v1/auth/forgot_password/", data={"email": self.member.email}).data["token"]
+		process_reset_requests()
+		code = QueuedEmail.objects.order_by("pk").last().text.splitlines()[-1]
+		return token, code
+
+	def test_confirm_and_reset_password(self):
+		self.client.credentials()
+		token, code = self.forgot_password()
+		self.assertWithinBudget(
+			"customauth:confirm", "post", "/v1/auth/confirm/", queries=2, status=200,
+			data={"token": token, "code": code})
+		reset = {
+			"token": token, "code": code, "password": "new-" + PASSWORD,
+			"again": "new-" + PASSWORD}
+		self.assertWithinBudget(
+			"customauth:reset-password", "put",
+			"/v1/auth/reset_password/{0}/".format(self.key), queries=4, status=200,
+			seconds=HASHING_TIME_BUDGET, data=reset)
+		# no session was used and the code works once
+		self.assertNotIn("sessionid", self.client.cookies)
+		response = self.client.put("/v1/auth/reset_password/{0}/".format(self.key), data=reset)
+		self.assertEqual(response.status_code, 403)
+
+	def test_wrong_reset_code(self):
+		self.client.credentials()
+		token, code = self.forgot_password()
+		wrong = "000000" if code != "000000" else "111111"
+		for attempt in range(settings.PASSWORD_RESET_MAX_ATTEMPTS):
+			response = self.client.post("/v1/auth/confirm/", data={"token": token, "code": wrong})
+			self.assertEqual(response.status_code, 403)
+		# out of attempts, the right code does not work anymore
+		response = self.client.post("/v1/auth/confirm/", data={"token": token, "code": code})
+		self.assertEqual(response.status_code, 403)
+		response = self.client.post("/v1/auth/confirm/", data={"token": token + "x", "code": code})
+		self.assertEqual(response.status_code, 403)
@@ -2,10 +2,12 @@ from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from django.core.mail import EmailMessage
 from django.core.validators import validate_email
 
 from .models import Profile
+from api.views_utils import save_changed_fields
+from .password_reset import (
+    request_password_reset, check_reset_code, use_reset_code)
 from .serializers import (
     RegisterSerializer, UserLoginSerializer, UserProfileSerializer)
 
@@ -17,9 +19,6 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenViewBase
 from rest_framework_simplejwt.tokens import RefreshToken
 
-import time
-import random
-
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -51,6 +50,8 @@ class ChangePasswordView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
                 data={'password1': "password fields dont match !"})
 
+        # request.user can be cached, check the password stored right now
+        user = User.objects.get(pk=user.pk)
         if not user.check_password(request.data['old_password']):
             return Response(
                 status=status.HTTP_403_FORBIDDEN,
@@ -63,9 +64,8 @@ class ChangePasswordView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
                 data={"detail": {"password": ex}})
 
-        instance = User.objects.get(profile__key=key)
-        instance.set_password(request.data['password1'])
-        instance.save()
+        user.set_password(request.data['password1'])
+        user.save(update_fields=['password'])
         return Response(
             status=status.HTTP_200_OK, data={"detail": "password changed"})
 
@@ -86,13 +86,11 @@ class UpdateProfileView(generics.UpdateAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
                 data={"detail": "no field modified"})
 
-        instance = User.objects.get(profile__key=key)
-        if 'first_name' in request.data:
-            instance.first_name = request.data['first_name']
-        if 'last_name' in request.data:
-            instance.last_name = request.data['last_name']
-        if 'email' in request.data:
-            if User.objects.exclude(profile__key=user.profile.key).filter(email=request.data['email']).exists():
+        # request.user can be cached, compare with the user stored right now
+        # uniqueness is only checked for values that change
+        instance = User.objects.get(pk=user.pk)
+        if 'email' in request.data and request.data['email'] != instance.email:
+            if User.objects.exclude(pk=instance.pk).filter(email=request.data['email']).exists():
                 return Response(
                     status=status.HTTP_406_NOT_ACCEPTABLE,
                     data={"email": "this email is already in use !"})
@@ -104,15 +102,19 @@ class UpdateProfileView(generics.UpdateAPIView):
                     status=status.HTTP_400_BAD_REQUEST,
                     data={"detail": {"email": ex}})
 
-            instance.email = request.data['email']
-        if 'username' in request.data:
-            if User.objects.exclude(profile__key=user.profile.key).filter(username=request.data['username']).exists():
+        if 'username' in request.data and request.data['username'] != instance.username:
+            if User.objects.exclude(pk=instance.pk).filter(username=request.data['username']).exists():
                 return Response(
                     status=status.HTTP_406_NOT_ACCEPTABLE,
                     data={"username": "this username is not available !"})
 
-            instance.username = request.data['username']
-        instance.save()
+        try:
+            save_changed_fields(
+                instance, request.data, ('first_name', 'last_name', 'email', 'username'))
+        except ValidationError as ex:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={"detail": ex.message_dict})
         return Response(status=status.HTTP_200_OK, data={"detail": "updated"})
 
 
@@ -137,7 +139,8 @@ class UpdateUserImageView(generics.UpdateAPIView):
             profile = get_object_or_404(Profile, key=key)
             profile.image = request.data['image']
             profile.user = user
-            profile.save()
+            # only the image, a full save would write back a stale movie_count
+            profile.save(update_fields=['image'])
             return Response(
                 status=status.HTTP_200_OK, data={"detail": 'modified'})
 
@@ -181,13 +184,15 @@ class DeleteProfileView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
                 data={'detail': 'password-required'})
 
+        # request.user can be cached, check the password stored right now
+        user = User.objects.get(pk=user.pk)
         if not user.check_password(request.data['password']):
             return Response(
                 status=status.HTTP_403_FORBIDDEN,
                 data={'detail': "password-incorrect"})
 
         user.is_active = False
-        user.save()
+        user.save(update_fields=['is_active'])
         return Response(status=status.HTTP_200_OK, data={"detail": "deleted"})
 
 
@@ -205,66 +210,58 @@ class ForgotPasswordView(APIView):
         except ValidationError:
             return Response(
                 status=status.HTTP_400_BAD_REQUEST,
-                یata={"detail": {"email": "enter a valid email address!"}})
+                data={"detail": {"email": "enter a valid email address!"}})
 
-        try:
-            user = User.objects.get(email=request.data["email"])
-        except User.DoesNotExist:
-            time.sleep(3)
-            return Response(status=status.HTTP_200_OK, data={'detail': "sent"})
-        mail_subject = 'Reset Your Password'
-        server_code = random.randint(10000, 999999)
-        name = "user"
-        if not user.first_name == "":
-            name = user.first_name
-        message = 'Hi {0},\nthis is your password reset code:\n{1}'.format(name, server_code)
-        to_email = user.email
-        EmailMessage(mail_subject, message, to=[to_email]).send()
-        request.session['code'] = server_code
-        request.session['user'] = user.username
-        return Response(status=status.HTTP_200_OK, data={'detail': "sent"})
+        # same work and a token for known and unknown emails, the lookup and the
+        # mail are done by the send_queued_emails worker so the response time dont
+        # depend on the email
+        token = request_password_reset(request.data['email'])
+        return Response(status=status.HTTP_200_OK, data={'detail': "sent", 'token': token})
 
 
 class ValidateConfirmationCodeView(APIView):
     permission_classes = (AllowAny,)
 
     def post(self, request, format=None):
-        if 'code' not in request.session and 'user' not in request.session:
-            return Response(
-                status=status.HTTP_404_NOT_FOUND,
-                data={'detail': 'session not found.'})
-
-        if 'code' not in request.data:
+        if 'token' not in request.data or 'code' not in request.data:
             return Response(
                 status=status.HTTP_400_BAD_REQUEST,
-                data={'detail': {"code": "required"}})
+                data={'detail': {"token": "required", "code": "required"}})
 
-        if not int(request.data['code']) == int(request.session.get('code')):
+        reset_code = check_reset_code(request.data['token'], request.data['code'])
+        if reset_code is None:
             return Response(
                 status=status.HTTP_403_FORBIDDEN,
                 data={'detail': 'wrong-code'})
 
         return Response(
-            status=status.HTTP_200_OK,
-            data={'key': get_object_or_404(User, username=request.session['user']).profile.key})
+            status=status.HTTP_200_OK, data={'key': reset_code.user.profile.key})
 
 
 class ResetPasswordView(APIView):
-    """ """
+    """ token and code of forgot password and the new password, no session needed. """
     permission_classes = (AllowAny,)
 
     def put(self, request, key, format=None):
-        user = get_object_or_404(User, username=request.session.get('user'))
+        required_fields = ['token', 'code', 'password', 'again']
+        missing = [field for field in required_fields if field not in request.data]
+        if missing:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={'detail': {field: "required" for field in missing}})
+
+        reset_code = check_reset_code(request.data['token'], request.data['code'])
+        if reset_code is None:
+            return Response(
+                status=status.HTTP_403_FORBIDDEN,
+                data={'detail': 'wrong-code'})
+
+        user = reset_code.user
         if user.profile.key != key:
             return Response(
                 status=status.HTTP_401_UNAUTHORIZED,
                 data={"detail": "unauthorized"})
 
-        if not 'password' and 'again' in request.data:
-            return Response(
-                status=status.HTTP_400_BAD_REQUEST,
-                data={'detail': {"password": "required", 'again': 'required'}})
-
         if request.data["password"] != request.data['again']:
             return Response(
                 status=status.HTTP_400_BAD_REQUEST,
@@ -277,7 +274,12 @@ class ResetPasswordView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
                 data={"detail": {"password": ex}})
 
+        # single use, a parallel reset with the same code loses here
+        if not use_reset_code(reset_code):
+            return Response(
+                status=status.HTTP_403_FORBIDDEN,
+                data={'detail': 'wrong-code'})
+
         user.set_password(request.data['password'])
-        user.save()
-        request.session.flush()
+        user.save(update_fields=['password'])
         return Response(status=status.HTTP_200_OK, data={'detail': 'done'})
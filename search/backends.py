@@ -0,0 +1,141 @@
+"""
+	search backends. the backend in use is the dotted path in SEARCH_BACKEND
+	setting and get_backend() return its instance.
+	a backend index documents of kind "post", "comment" or "movie" with a 'key',
+	'title' and 'body' and 'search' return [(kind, key), ...] best match first.
+
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from config.settings import SEARCH_BACKEND
+
+KINDS = ("post", "comment", "movie")
+
+_backend = None
+
+
+def get_backend():
+	global _backend
+	if _backend is None:
+		_backend = import_string(SEARCH_BACKEND)()
+	return _backend
+
+
+def documents():
+	""" (kind, pk, key, title, body) of every document that should be indexed. """
+	from api.models import Movie
+	from blog.models import Post, Comment
+
+	for post in Post.objects.values_list("pk", "key", "title", "body").iterator():
+		yield ("post", ) + post
+	for comment in Comment.objects.filter(is_active=True).values_list("pk", "key", "body").iterator():
+		yield ("comment", comment[0], comment[1], "", comment[2])
+	movies = Movie.objects.values_list("pk", "key", "name", "description", "review")
+	for pk, key, name, description, review in movies.iterator():
+		yield ("movie", pk, key, name, "\n".join(filter(None, [description, review])))
+
+
+class BaseSearchBackend:
+	def setup(self):
+		""" create what the backend need, called after migrate. """
+
+	def index(self, kind, pk, key, title, body):
+		""" add or replace one document. """
+
+	def remove(self, kind, pk):
+		""" remove one document if indexed. """
+
+	def rebuild(self):
+		""" index every document from scratch. """
+
+	def search(self, query, limit):
+		raise NotImplementedError
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+	"""
+		inverted index in a sqlite FTS5 virtual table. rowid of a document is
+		derived from its kind and pk so replace and delete are rowid lookups.
+		matches are ranked with bm25, title weighted more than body.
+
+	"""
+
+	table = "search_index"
+
+	def rowid(self, kind, pk):
+		return pk * len(KINDS) + KINDS.index(kind)
+
+	def setup(self):
+		with connection.cursor() as cursor:
+			cursor.execute(
+				"CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5("
+				"kind UNINDEXED, key UNINDEXED, title, body)".format(self.table))
+
+	def index(self, kind, pk, key, title, body):
+		with connection.cursor() as cursor:
+			cursor.execute(
+				"INSERT OR REPLACE INTO {0} (rowid, kind, key, title, body) "
+				"VALUES (%s, %s, %s, %s, %s)".format(self.table),
+				[self.rowid(kind, pk), kind, key, title or "", body or ""])
+
+	def remove(self, kind, pk):
+		with connection.cursor() as cursor:
+			cursor.execute(
+				"DELETE FROM {0} WHERE rowid = %s".format(self.table), [self.rowid(kind, pk)])
+
+	def rebuild(self):
+		with connection.cursor() as cursor:
+			cursor.execute("DELETE FROM {0}".format(self.table))
+			cursor.executemany(
+				"INSERT INTO {0} (rowid, kind, key, title, body) "
+				"VALUES (%s, %s, %s, %s, %s)".format(self.table),
+				[
+					(self.rowid(kind, pk), kind, key, title or "", body or "")
+					for kind, pk, key, title, body in documents()])
+
+	def search(self, query, limit):
+		# every word quoted so user input can not use FTS5 query syntax
+		words = re.findall(r"\w+", query)
+		if not words:
+			return []
+		match = " ".join('"{0}"'.format(word) for word in words)
+		with connection.cursor() as cursor:
+			cursor.execute(
+				"SELECT kind, key FROM {0} WHERE {0} MATCH %s "
+				"ORDER BY bm25({0}, 0, 0, 10.0, 1.0) LIMIT %s".format(self.table),
+				[match, limit])
+			return cursor.fetchall()
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+	"""
+		fallback for databases without a full-text index. no index to maintain,
+		search is 'icontains' over the models so it scan the tables. posts first,
+		then comments then movies.
+
+	"""
+
+	def search(self, query, limit):
+		from api.models import Movie
+		from blog.models import Post, Comment
+
+		query = query.strip()
+		if not query:
+			return []
+		results = [
+			("post", key) for key in Post.objects.filter(
+				Q(title__icontains=query) | Q(body__icontains=query)
+			).values_list("key", flat=True)[:limit]]
+		results += [
+			("comment", key) for key in Comment.objects.filter(
+				is_active=True, body__icontains=query
+			).values_list("key", flat=True)[:limit - len(results)]]
+		results += [
+			("movie", key) for key in Movie.objects.filter(
+				Q(name__icontains=query) | Q(description__icontains=query)
+				| Q(review__icontains=query)
+			).values_list("key", flat=True)[:limit - len(results)]]
+		return results
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from search.backends import get_backend
+
+
+class Command(BaseCommand):
+	help = "create the search index if needed and index every post, comment and movie from scratch."
+
+	def handle(self, *args, **options):
+		backend = get_backend()
+		backend.setup()
+		backend.rebuild()
+		self.stdout.write("search index rebuilt.")
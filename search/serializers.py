@@ -0,0 +1,29 @@
+from rest_framework import serializers
+from api.serializers import MovieSerializer
+from blog.serializers import DemoPostSerializer, CommentSerializer
+
+
+class SearchCommentSerializer(CommentSerializer):
+	"""
+		comment with key of its post so the client can open the post.
+
+	"""
+
+	post = serializers.CharField(source="post.key")
+
+	class Meta(CommentSerializer.Meta):
+		fields = CommentSerializer.Meta.fields + ("post", )
+
+
+SERIALIZERS = {
+	"post": DemoPostSerializer,
+	"comment": SearchCommentSerializer,
+	"movie": MovieSerializer,
+}
+
+
+def serialize_results(results):
+	""" [(kind, object), ...] to [{"type": kind, "data": serialized object}, ...] """
+	return [
+		{"type": kind, "data": SERIALIZERS[kind](instance=obj).data}
+		for kind, obj in results]
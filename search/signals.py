@@ -0,0 +1,56 @@
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+from api.models import Movie
+from api.signals import movies_bulk_changed
+from blog.models import Post, Comment
+from .backends import get_backend
+
+
+@receiver(post_migrate)
+def create_search_index(sender, using, **kwargs):
+	get_backend().setup()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+	get_backend().index("post", instance.pk, instance.key, instance.title, instance.body)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, **kwargs):
+	if instance.is_active:
+		get_backend().index("comment", instance.pk, instance.key, "", instance.body)
+	else:
+		get_backend().remove("comment", instance.pk)
+
+
+def index_movie(movie):
+	body = "\n".join(filter(None, [movie.description, movie.review]))
+	get_backend().index("movie", movie.pk, movie.key, movie.name, body)
+
+
+@receiver(post_save, sender=Movie)
+def movie_saved(sender, instance, **kwargs):
+	index_movie(instance)
+
+
+@receiver(movies_bulk_changed)
+def movies_bulk_changed_handler(sender, user, keys, **kwargs):
+	# bulk created movies have no pk on the instances, fetch them by key
+	for movie in Movie.objects.filter(key__in=keys):
+		index_movie(movie)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+	get_backend().remove("post", instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+	get_backend().remove("comment", instance.pk)
+
+
+@receiver(post_delete, sender=Movie)
+def movie_deleted(sender, instance, **kwargs):
+	get_backend().remove("movie", instance.pk)
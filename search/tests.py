@@ -0,0 +1,29 @@
+from api.benchmark import BudgetTestCase
+from blog.models import Post
+
+
+class SearchEndpointBudgetTests(BudgetTestCase):
+	""" query-count and wall-time budgets of search/urls.py endpoints. """
+
+	def setUp(self):
+		super(SearchEndpointBudgetTests, self).setUp()
+		self.authenticate(self.data["member"])
+
+	def test_search(self):
+		response = self.assertWithinBudget(
+			"search:search", "get", "/v1/search/?q=movie", queries=3, status=200)
+		self.assertTrue(response.data["results"])
+
+	def test_search_hides_restricted_posts(self):
+		self.authenticate(self.data["outsider"])
+		response = self.assertWithinBudget(
+			"search:search-restricted", "get", "/v1/search/?q=group+post", queries=4,
+			status=200)
+		keys = [result["data"]["key"] for result in response.data["results"]]
+		self.assertNotIn(self.data["group_post"].key, keys)
+
+	def test_search_indexes_new_post(self):
+		Post.objects.create(
+			title="unique zeppelin", body="body", author=self.data["member"], visibility="draft")
+		response = self.client.get("/v1/search/?q=zeppelin")
+		self.assertEqual([result["type"] for result in response.data["results"]], ["post"])
@@ -0,0 +1,50 @@
+from django.db.models import Exists, OuterRef, Q
+from rest_framework import pagination
+from api.models import Movie
+from blog.models import Post, Comment
+from customauth.models import Profile
+
+
+class SearchPaginator(pagination.LimitOffsetPagination):
+	"""
+		paginator of search results. pass 'limit' and 'offset' parameters in the
+		url like : search/?q=film&limit=20&offset=20
+
+	"""
+
+	default_limit = 20
+	max_limit = 100
+
+
+def visible_objects(hits, user):
+	"""
+		turn backend [(kind, key), ...] hits to [(kind, object), ...] in the same
+		order and drop what the user can not see. one query per kind:
+		posts -> Post.objects.visible_to(user)
+		comments -> active comments of visible posts
+		movies -> user own movies and movies of users sharing a group with the user
+
+	"""
+
+	keys = {kind: [] for kind in ("post", "comment", "movie")}
+	for kind, key in hits:
+		keys[kind].append(key)
+
+	visible_posts = Post.objects.visible_to(user)
+	objects = {}
+	if keys["post"]:
+		posts = visible_posts.filter(key__in=keys["post"]).select_related("author__profile")
+		objects.update({("post", post.key): post for post in posts})
+	if keys["comment"]:
+		comments = Comment.objects.filter(
+			key__in=keys["comment"], is_active=True,
+			post__in=visible_posts.values("pk")).select_related("author__profile", "post")
+		objects.update({("comment", comment.key): comment for comment in comments})
+	if keys["movie"]:
+		shared_group = Profile.group.through.objects.filter(
+			profile__user_id=OuterRef("user_id"), group__profile__user=user)
+		movies = Movie.objects.filter(key__in=keys["movie"]).annotate(
+			shares_group=Exists(shared_group)).filter(
+			Q(user=user) | Q(shares_group=True)).select_related("user")
+		objects.update({("movie", movie.key): movie for movie in movies})
+	return [(kind, objects[(kind, key)]) for kind, key in hits if (kind, key) in objects]
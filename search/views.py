@@ -0,0 +1,47 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from config.settings import SEARCH_MAX_RESULTS
+from .backends import get_backend
+from .serializers import serialize_results
+from .utils import SearchPaginator, visible_objects
+
+
+class SearchView(APIView):
+	"""
+		full-text search in posts title and body, comments body and movies name,
+		description and review. query should pass as 'q' parameter in url.
+	"""
+	permission_classes = (permissions.IsAuthenticated, )
+
+	def get(self, request, format=None):
+		"""
+			Attributes
+			----------
+			query -> String : the 'q' url parameter
+			hits -> list : [(kind, key), ...] best match first from the search backend, at most SEARCH_MAX_RESULTS
+			results -> list : [(kind, object), ...] of hits that user can see
+			paginator -> search.utils.SearchPaginator(object) : limit offset paginator of results
+
+			Responses
+			----------
+			400 -> key="detail", value="'q' parameter is required." : if 'q' not in url parameters or empty
+			200 -> [key="count", value=number of results], [key="next", value=next page link], [key="previous", value=previous page link], [key="results", value=list of {"type": "post"|"comment"|"movie", "data": serialized object}]
+
+			Input Types
+			----------
+			q -> String : url parameter like '?q=matrix'
+			limit -> int : optional url parameter, default 20 max 100
+			offset -> int : optional url parameter
+		"""
+		query = request.query_params.get("q", "").strip()
+		if not query:
+			return Response(
+				status=status.HTTP_400_BAD_REQUEST,
+				data={"detail": "'q' parameter is required."})
+
+		hits = get_backend().search(query, SEARCH_MAX_RESULTS)
+		results = visible_objects(hits, request.user)
+		paginator = SearchPaginator()
+		page = paginator.paginate_queryset(results, request, view=self)
+		return paginator.get_paginated_response(serialize_results(page))